@@ -0,0 +1,32 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib import admin
+
+from .pagination import EstimatedCountPaginator, estimated_count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список объектов для таблиц на миллионы строк.
+
+    Число строк без фильтров оценивается, а не считается COUNT(*),
+    общее число строк рядом с результатами поиска не выводится.
+    Связанные объекты стоит загружать через list_select_related,
+    а для внешних ключей указывать autocomplete_fields.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def estimated_count(self, queryset):
+        """Число строк таблицы; переопределяется, если есть счётчик"""
+        return estimated_count(queryset)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            estimate=partial(self.estimated_count, queryset),
+            exact_limit=settings.ADMIN_EXACT_COUNT_LIMIT,
+        )
@@ -0,0 +1,312 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .resp import Connection, RespError
+
+
+class RedisCache(BaseCache):
+    """
+    Общий для всех процессов кэш на сервере с протоколом Redis.
+
+    LOCATION — адрес вида redis://[:пароль@]хост:порт/номер_базы.
+    Целые числа хранятся как есть, чтобы incr выполнялся на сервере
+    атомарно, остальные значения сериализуются pickle.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._url = server
+        self._socket_timeout = params.get('OPTIONS', {}).get(
+            'SOCKET_TIMEOUT', 1
+        )
+        # соединение на поток: сокет нельзя делить между потоками
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = Connection(self._url, self._socket_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, *args):
+        return self._connection.execute(*args)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _ttl_args(self, timeout):
+        if timeout is None:
+            return ()
+        return ('PX', max(int(timeout * 1000), 1))
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        """Время жизни в секундах или None для вечного ключа"""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return b'%d' % value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def _set_command(self, key, value, timeout, *flags):
+        return ('SET', key, self._encode(value)) + (
+            self._ttl_args(timeout) + flags
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return False
+        return self._execute(
+            *self._set_command(key, value, timeout, 'NX')
+        ) is not None
+
+    def get(self, key, default=None, version=None):
+        value = self._execute('GET', self._key(key, version))
+        return default if value is None else self._decode(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            self._execute('DEL', key)
+            return
+        self._execute(*self._set_command(key, value, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            _, exists = self._connection.execute_many([
+                ('PERSIST', key), ('EXISTS', key)
+            ])
+            return exists == 1
+        return self._execute(
+            'PEXPIRE', key, max(int(timeout * 1000), 1)
+        ) == 1
+
+    def delete(self, key, version=None):
+        self._execute('DEL', self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._execute(
+            'MGET', *[self._key(key, version) for key in keys]
+        )
+        return {
+            key: self._decode(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            self.delete_many(data, version)
+            return []
+        self._connection.execute_many([
+            self._set_command(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ])
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._execute('DEL', *keys)
+
+    def has_key(self, key, version=None):
+        return self._execute('EXISTS', self._key(key, version)) == 1
+
+    def incr(self, key, delta=1, version=None):
+        raw_key = self._key(key, version)
+        # INCRBY создал бы отсутствующий ключ, а Django ждёт ValueError
+        if not self._execute('EXISTS', raw_key):
+            raise ValueError(f"Key '{key}' not found")
+        try:
+            return self._execute('INCRBY', raw_key, delta)
+        except RespError:
+            # значение не целое число: прибавляем так же, как BaseCache
+            return super().incr(key, delta, version)
+
+    def clear(self):
+        self._execute('FLUSHDB')
+
+    def close(self, **kwargs):
+        # Django вызывает close() после каждого запроса; соединение
+        # оставляем открытым, чтобы не подключаться заново
+        pass
+
+    def disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+
+
+class LocalLRU:
+    """Небольшой потокобезопасный LRU-кэш в памяти процесса"""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+    LOCATION — имя общего кэша в CACHES. Локально хранятся только
+    ключи с префиксами из OPTIONS['LOCAL_PREFIXES']. Туда стоит
+    включать лишь ключи, значение которых под одним и тем же ключом
+    не меняется, например фрагменты лент: версия ленты входит в их
+    ключ, и сброс кэша в другом процессе просто переводит чтение на
+    новый ключ. Остальные операции идут прямо в общий кэш.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = server
+        self._prefixes = tuple(options.get('LOCAL_PREFIXES', ()))
+        self._local = LocalLRU(
+            options.get('LOCAL_MAX_ENTRIES', 256),
+            options.get('LOCAL_TIMEOUT', 60),
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return key.startswith(self._prefixes)
+
+    def _local_key(self, key, version):
+        return self.make_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key):
+            return self.shared.get(key, default, version)
+        local_key = self._local_key(key, version)
+        entry = self._local.get(local_key)
+        if entry is not None:
+            return entry[1]
+        value = self.shared.get(key, self, version)
+        if value is self:
+            return default
+        self._local.set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        missing = []
+        for key in keys:
+            entry = None
+            if self._is_local(key):
+                entry = self._local.get(self._local_key(key, version))
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = entry[1]
+        if missing:
+            shared = self.shared.get_many(missing, version)
+            for key, value in shared.items():
+                if self._is_local(key):
+                    self._local.set(self._local_key(key, version), value)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        if self._is_local(key):
+            self._local.set(self._local_key(key, version), value)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.add(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._local.set(self._local_key(key, version), value)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._local.delete(self._local_key(key, version))
+        self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local.delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version)
+
+    def clear(self):
+        self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
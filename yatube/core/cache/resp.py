@@ -0,0 +1,128 @@
+import socket
+from urllib.parse import urlparse
+
+CRLF = b'\r\n'
+
+
+class RespError(Exception):
+    """Ошибка, которую вернул сервер"""
+
+
+class ConnectionClosed(ConnectionError):
+    """Сервер закрыл соединение, не прислав ответа"""
+
+
+def encode_command(*args):
+    """Команда в виде массива bulk-строк протокола RESP"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = b'%d' % arg
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(stream):
+    """Читает один ответ RESP из файлового объекта сокета"""
+    line = stream.readline()
+    if not line:
+        raise ConnectionClosed('Соединение с сервером кэша закрыто')
+    if not line.endswith(CRLF):
+        raise ConnectionError('Оборванный ответ сервера кэша')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode()
+    if kind == b'-':
+        raise RespError(payload.decode())
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise ConnectionError(f'Непонятный ответ сервера кэша: {line!r}')
+
+
+class Connection:
+    """
+    Соединение с сервером, понимающим протокол Redis.
+
+    Поддерживает конвейер: execute_many отправляет все команды одним
+    пакетом и затем читает ответы.
+    """
+
+    def __init__(self, url, timeout=None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.strip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self.sock = None
+        self.stream = None
+
+    def connect(self):
+        self.sock = socket.create_connection(
+            (self.host, self.port), self.timeout
+        )
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile('rb')
+        if self.password:
+            self._send(encode_command('AUTH', self.password), 1)
+        if self.db:
+            self._send(encode_command('SELECT', self.db), 1)
+
+    def close(self):
+        if self.sock is not None:
+            self.stream.close()
+            self.sock.close()
+        self.sock = self.stream = None
+
+    def _send(self, payload, count):
+        self.sock.sendall(payload)
+        replies = []
+        error = None
+        for _ in range(count):
+            try:
+                replies.append(read_reply(self.stream))
+            except RespError as exc:
+                # ответы на остальные команды всё равно надо дочитать
+                error = error or exc
+                replies.append(None)
+        if error:
+            raise error
+        return replies
+
+    def execute_many(self, commands):
+        if not commands:
+            return []
+        payload = b''.join(encode_command(*command) for command in commands)
+        if self.sock is None:
+            self.connect()
+        try:
+            return self._send(payload, len(commands))
+        except (ConnectionClosed, BrokenPipeError, ConnectionResetError):
+            # сервер закрыл простаивавшее соединение до того, как
+            # выполнил команды: их можно отправить повторно
+            self.close()
+            self.connect()
+        except OSError:
+            self.close()
+            raise
+        try:
+            return self._send(payload, len(commands))
+        except OSError:
+            self.close()
+            raise
+
+    def execute(self, *args):
+        return self.execute_many([args])[0]
@@ -0,0 +1,188 @@
+import socketserver
+import threading
+import time
+
+from .resp import CRLF, RespError, read_reply
+
+
+def _bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def _encode_reply(value):
+    if isinstance(value, RespError):
+        return b'-%s\r\n' % str(value).encode()
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(
+            _encode_reply(item) if isinstance(item, int) else _bulk(item)
+            for item in value
+        )
+    return _bulk(value)
+
+
+class Store:
+    """
+    Данные сервера: словарь значений и сроков жизни.
+
+    Реализует подмножество команд Redis, которым пользуется RedisCache.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.databases = {}
+        self.expires = {}
+
+    def _db(self, db):
+        return self.databases.setdefault(db, {}), self.expires.setdefault(
+            db, {}
+        )
+
+    def _alive(self, db, key):
+        data, expires = self._db(db)
+        deadline = expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            data.pop(key, None)
+            expires.pop(key, None)
+        return key in data
+
+    def execute(self, session, name, *args):
+        handler = getattr(self, f'cmd_{name.decode().lower()}', None)
+        if handler is None:
+            return RespError(f'ERR unknown command {name.decode()!r}')
+        with self.lock:
+            try:
+                return handler(session, *args)
+            except (ValueError, TypeError) as error:
+                return RespError(f'ERR {error}')
+
+    def cmd_ping(self, session, *args):
+        return 'PONG'
+
+    def cmd_auth(self, session, password):
+        return 'OK'
+
+    def cmd_select(self, session, db):
+        session['db'] = int(db)
+        return 'OK'
+
+    def cmd_get(self, session, key):
+        db = session['db']
+        return self.databases[db][key] if self._alive(db, key) else None
+
+    def cmd_mget(self, session, *keys):
+        return [self.cmd_get(session, key) for key in keys]
+
+    def cmd_set(self, session, key, value, *options):
+        db = session['db']
+        data, expires = self._db(db)
+        options = [option.upper() for option in options]
+        exists = self._alive(db, key)
+        if b'NX' in options and exists or b'XX' in options and not exists:
+            return None
+        data[key] = value
+        expires.pop(key, None)
+        for unit, scale in ((b'PX', 1000), (b'EX', 1)):
+            if unit in options:
+                ttl = int(options[options.index(unit) + 1])
+                expires[key] = time.monotonic() + ttl / scale
+        return 'OK'
+
+    def cmd_del(self, session, *keys):
+        db = session['db']
+        data, expires = self._db(db)
+        deleted = 0
+        for key in keys:
+            if self._alive(db, key):
+                del data[key]
+                expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    def cmd_exists(self, session, *keys):
+        return sum(self._alive(session['db'], key) for key in keys)
+
+    def cmd_incrby(self, session, key, delta):
+        db = session['db']
+        data, _ = self._db(db)
+        current = data[key] if self._alive(db, key) else b'0'
+        try:
+            value = int(current) + int(delta)
+        except ValueError:
+            return RespError('ERR value is not an integer or out of range')
+        data[key] = b'%d' % value
+        return value
+
+    def cmd_pexpire(self, session, key, milliseconds):
+        db = session['db']
+        if not self._alive(db, key):
+            return 0
+        self._db(db)[1][key] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def cmd_persist(self, session, key):
+        db = session['db']
+        if not self._alive(db, key):
+            return 0
+        return int(self._db(db)[1].pop(key, None) is not None)
+
+    def cmd_flushdb(self, session):
+        data, expires = self._db(session['db'])
+        data.clear()
+        expires.clear()
+        return 'OK'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        session = {'db': 0}
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                self.wfile.write(b'-ERR protocol error' + CRLF)
+                return
+            self.wfile.write(_encode_reply(
+                self.server.store.execute(session, *command)
+            ))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Сервер с протоколом Redis в памяти процесса.
+
+    Нужен для тестов и локальной разработки: несколько процессов
+    Django, подключённых к нему, делят один кэш так же, как с
+    настоящим Redis. Данные не сохраняются на диск.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, _Handler)
+        self.store = Store()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
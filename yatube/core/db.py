@@ -0,0 +1,58 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# cookie, пока которая жива, пользователь читает только с основной базы
+STICKY_COOKIE = 'primary_reads'
+
+_state = threading.local()
+
+
+def reset():
+    """Начало нового запроса: чтение с основной базы, записей не было"""
+    _state.replica = None
+    _state.wrote = False
+
+
+def use_replica():
+    """
+    Чтения до конца запроса можно отправлять на реплику.
+
+    Реплика выбирается один раз на запрос: реплики отстают по-разному,
+    и страница, собранная с нескольких, могла бы быть несогласованной.
+    """
+    replicas = settings.READ_REPLICAS
+    _state.replica = random.choice(replicas) if replicas else None
+
+
+def wrote():
+    """Была ли в текущем запросе запись в базу"""
+    return getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    """
+    Отправляет запись на основную базу, а чтение — на реплику,
+    выбранную для запроса из READ_REPLICAS.
+
+    Реплики используются, только если middleware разрешила это для
+    текущего запроса; команды и фоновые задачи читают с основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        # после записи в запросе читаем то, что только что записали
+        _state.replica = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии основной базы с теми же объектами
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.READ_REPLICAS
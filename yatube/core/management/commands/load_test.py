@@ -0,0 +1,140 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+
+def default_paths():
+    """Главная, первая группа, профиль и страница последнего поста"""
+    paths = [reverse('posts:index')]
+    group = Group.objects.order_by('pk').first()
+    if group:
+        paths.append(reverse('posts:group_list', args=[group.slug]))
+    post = Post.objects.select_related('author').order_by('-pk').first()
+    if post:
+        paths.append(reverse('posts:profile', args=[post.author.username]))
+        paths.append(reverse('posts:post_detail', args=[post.pk]))
+    return paths
+
+
+def run_requests(paths, duration, threads):
+    """
+    Запрашивает страницы через WSGI-обработчик из нескольких потоков.
+
+    После каждого ответа, как и настоящий сервер, закрывает его:
+    на этом Django закрывает или сохраняет соединение с базой
+    в зависимости от CONN_MAX_AGE.
+    """
+    handler = WSGIHandler()
+    factory = RequestFactory()
+
+    def loop(number):
+        timings, errors = [], 0
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            path = paths[(number + len(timings)) % len(paths)]
+            started = time.perf_counter()
+            response = handler(factory.get(path).environ, start_response)
+            b''.join(response)
+            response.close()
+            timings.append(time.perf_counter() - started)
+            if statuses.pop() >= 400:
+                errors += 1
+        connections.close_all()
+        return timings, errors
+
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(loop, range(threads)))
+    timings = sorted(t for thread, _ in results for t in thread)
+    if not timings:
+        raise CommandError('Не выполнено ни одного запроса')
+    return {
+        'profile': settings.DB_PROFILE,
+        'requests': len(timings),
+        'errors': sum(errors for _, errors in results),
+        'rps': len(timings) / duration,
+        'p50_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95)] * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест страниц сайта в разных профилях базы данных '
+        '(DB_PROFILE). Каждый профиль запускается в отдельном процессе. '
+        'Профиль production переводит файл SQLite в режим WAL, '
+        'поэтому его стоит запускать последним'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Адреса страниц; по умолчанию лента, группа, '
+                 'профиль и пост',
+        )
+        parser.add_argument(
+            '--profile', action='append', dest='profiles',
+            help='Профиль базы, можно несколько; по умолчанию '
+                 'development и production',
+        )
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--worker', action='store_true',
+            help='Прогнать тест в текущем профиле и вывести JSON',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or default_paths()
+        if options['worker']:
+            result = run_requests(
+                paths, options['duration'], options['threads']
+            )
+            self.stdout.write(json.dumps(result))
+            return
+        baseline = None
+        for profile in options['profiles'] or ['development', 'production']:
+            result = self.run_profile(profile, paths, options)
+            baseline = baseline or result['rps']
+            self.stdout.write(
+                f'{profile}: {result["rps"]:.1f} запросов/с '
+                f'(x{result["rps"] / baseline:.2f}), '
+                f'p50 {result["p50_ms"]:.1f} мс, '
+                f'p95 {result["p95_ms"]:.1f} мс, '
+                f'ошибок {result["errors"]} из {result["requests"]}'
+            )
+
+    def run_profile(self, profile, paths, options):
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+            'load_test', '--worker',
+            '--duration', str(options['duration']),
+            '--threads', str(options['threads']),
+            *paths,
+        ]
+        process = subprocess.run(
+            command, env={**os.environ, 'DB_PROFILE': profile},
+            capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise CommandError(
+                f'Профиль {profile} завершился с ошибкой:\n{process.stderr}'
+            )
+        return json.loads(process.stdout.strip().splitlines()[-1])
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import metrics
+
+
+class Command(BaseCommand):
+    help = 'Выводит накопленные метрики в формате JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить метрики после вывода',
+        )
+
+    def handle(self, *args, **options):
+        if not metrics.is_shared():
+            raise CommandError(
+                'Метрики хранятся в памяти каждого процесса сервера, '
+                'и команде они не видны. Задайте CACHE_URL с общим '
+                'кэшем или включите лог core.metrics на уровне DEBUG'
+            )
+        self.stdout.write(json.dumps(
+            metrics.snapshot(), indent=2, ensure_ascii=False
+        ))
+        if options['reset']:
+            metrics.reset()
@@ -0,0 +1,63 @@
+import logging
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+NAMES_KEY = 'metrics:names'
+
+# кэши, содержимое которых видит только текущий процесс
+PROCESS_CACHES = (LocMemCache, DummyCache)
+
+
+def _key(name):
+    return f'metrics:{name}'
+
+
+def _register(name):
+    names = cache.get(NAMES_KEY, set())
+    if name not in names:
+        cache.set(NAMES_KEY, names | {name}, None)
+
+
+def incr(name, value=1):
+    """Увеличивает накопительную метрику"""
+    try:
+        cache.incr(_key(name), value)
+    except ValueError:
+        cache.set(_key(name), value, None)
+        _register(name)
+    logger.debug('%s +%s', name, value)
+
+
+def gauge(name, value):
+    """Запоминает текущее значение метрики"""
+    cache.set(_key(name), value, None)
+    _register(name)
+    logger.debug('%s = %s', name, value)
+
+
+def is_shared():
+    """
+    Видны ли метрики другим процессам.
+
+    В LocMemCache каждый процесс сервера копит свои метрики, а
+    отдельно запущенная команда видит только собственные, то есть
+    ничего. Тогда значения есть только в логе core.metrics (DEBUG).
+    """
+    return not isinstance(caches['default'], PROCESS_CACHES)
+
+
+def snapshot():
+    """Значения всех записанных метрик"""
+    names = sorted(cache.get(NAMES_KEY, set()))
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name)) for name in names}
+
+
+def reset():
+    cache.delete_many(
+        [_key(name) for name in cache.get(NAMES_KEY, set())] + [NAMES_KEY]
+    )
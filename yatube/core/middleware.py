@@ -0,0 +1,51 @@
+from django.conf import settings
+
+from . import db
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик представлениям с replica_reads = True.
+
+    Только для безопасных методов и только если пользователь ничего
+    не записывал последние REPLICA_STICKY_SECONDS секунд: реплика
+    может отставать, а автор должен сразу увидеть свой пост.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db.reset()
+        try:
+            response = self.get_response(request)
+            if db.wrote() and self._user_wrote(request):
+                response.set_cookie(
+                    db.STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True,
+                    samesite='Lax',
+                )
+        finally:
+            db.reset()
+        return response
+
+    @staticmethod
+    def _user_wrote(request):
+        # запись при GET гостя — служебная, например первый подсчёт
+        # счётчиков; своих данных гость не меняет
+        user = getattr(request, 'user', None)
+        return request.method not in SAFE_METHODS or (
+            user is not None and user.is_authenticated
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if (
+            request.method in SAFE_METHODS
+            and getattr(view, 'replica_reads', False)
+            and db.STICKY_COOKIE not in request.COOKIES
+        ):
+            db.use_replica()
@@ -0,0 +1,283 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject, cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+# пропуск в списке номеров страниц
+ELLIPSIS = '…'
+
+
+def elided_page_range(paginator, number, on_each_side=2, on_ends=1):
+    """
+    Номера страниц для навигации: края и окно вокруг текущей.
+
+    Как Paginator.get_elided_page_range из Django 3.2: пропуски
+    отмечаются ELLIPSIS, а число номеров не зависит от числа страниц.
+    """
+    number = paginator.validate_number(number)
+    num_pages = paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2:
+        yield from paginator.page_range
+        return
+    if number > 1 + on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+class CursorPage(Page):
+    """Страница, полученная по курсору: без номера и без подсчёта строк"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = paginator.cursor_for(self, NEXT)
+        self.previous_cursor = paginator.cursor_for(self, PREVIOUS)
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинатор с поиском по ключу (дата, id), по умолчанию (created, pk).
+
+    Обычные страницы (?page=N) работают как в Paginator, а переход
+    по курсору (?cursor=...) стоит одинаково на любой глубине ленты:
+    вместо OFFSET в запрос добавляется условие по последней
+    показанной записи.
+
+    Если число записей известно заранее (count), COUNT(*) не выполняется.
+    """
+    key_fields = ('created', 'pk')
+
+    def __init__(self, object_list, per_page, count=None, key_fields=None,
+                 **kwargs):
+        self.date_field, self.id_field = key_fields or self.key_fields
+        if hasattr(object_list, 'order_by'):
+            object_list = object_list.order_by(
+                f'-{self.date_field}', f'-{self.id_field}'
+            )
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        # курсоры считаются лениво, чтобы не вычислять страницу,
+        # если шаблон их не запросит
+        page.next_cursor = SimpleLazyObject(
+            lambda: self.cursor_for(page, NEXT)
+        )
+        page.previous_cursor = SimpleLazyObject(
+            lambda: self.cursor_for(page, PREVIOUS)
+        )
+        return page
+
+    @property
+    def last_cursor(self):
+        return self.encode_cursor(LAST)
+
+    def cursor_for(self, page, direction):
+        """Курсор соседней страницы или пустая строка, если её нет"""
+        if direction == NEXT:
+            if not page.has_next():
+                return ''
+            obj = page[len(page) - 1]
+        else:
+            if not page.has_previous():
+                return ''
+            obj = page[0]
+        return self.encode_cursor(
+            direction,
+            getattr(obj, self.date_field),
+            getattr(obj, self.id_field),
+        )
+
+    def encode_cursor(self, direction, created=None, pk=None):
+        value = direction
+        if created is not None:
+            value = f'{direction}|{created.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(
+            value.encode()
+        ).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            value = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)
+            ).decode()
+            if value == LAST:
+                return LAST, None, None
+            direction, created, pk = value.split('|')
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError
+            return direction, datetime.fromisoformat(created), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidPage('Некорректный курсор')
+
+    def seek(self, direction, created, pk):
+        """
+        Записи после (NEXT) или перед (PREVIOUS) ключом, без OFFSET.
+
+        Условие по дате повторяется отдельным фильтром: из одного
+        OR база не выводит границу диапазона индекса и читает все
+        записи новее курсора.
+        """
+        if direction == NEXT:
+            return self.object_list.filter(
+                **{f'{self.date_field}__lte': created}
+            ).filter(
+                Q(**{f'{self.date_field}__lt': created})
+                | Q(**{self.date_field: created, f'{self.id_field}__lt': pk})
+            )
+        if direction == PREVIOUS:
+            return self._ascending().filter(
+                **{f'{self.date_field}__gte': created}
+            ).filter(
+                Q(**{f'{self.date_field}__gt': created})
+                | Q(**{self.date_field: created, f'{self.id_field}__gt': pk})
+            )
+        return self._ascending()
+
+    def first_page(self):
+        """Первая страница без подсчёта записей"""
+        rows = list(self.object_list[:self.per_page + 1])
+        return CursorPage(
+            rows[:self.per_page], self, len(rows) > self.per_page, False
+        )
+
+    def cursor_page(self, cursor):
+        """Вернуть страницу, соседнюю с записью из курсора"""
+        direction, created, pk = self.decode_cursor(cursor)
+        limit = self.per_page + 1
+        rows = list(self.seek(direction, created, pk)[:limit])
+        if direction == LAST:
+            has_previous = len(rows) > self.per_page
+            return CursorPage(
+                rows[:self.per_page][::-1], self, False, has_previous
+            )
+        if direction == NEXT:
+            if not rows:
+                raise EmptyPage('Страница не содержит записей')
+            return CursorPage(
+                rows[:self.per_page], self,
+                len(rows) > self.per_page, True
+            )
+        if len(rows) <= self.per_page:
+            # дошли до начала ленты — показываем обычную первую страницу
+            return self.page(1)
+        return CursorPage(rows[:self.per_page][::-1], self, True, True)
+
+    def _ascending(self):
+        return self.object_list.order_by(self.date_field, self.id_field)
+
+
+class CursorPaginationMixin:
+    """Подключает к ListView переход по курсору (?cursor=...)"""
+    paginator_class = CursorPaginator
+    cursor_kwarg = 'cursor'
+
+    def get_paginate_count(self):
+        """Заранее известное число записей или None для COUNT(*)"""
+        return None
+
+    def get_paginate_key_fields(self):
+        """Поля ключа (дата, id), по которым идёт переход по курсору"""
+        return None
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(
+            queryset, per_page,
+            count=self.get_paginate_count(),
+            key_fields=self.get_paginate_key_fields(),
+            **kwargs
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if not cursor:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty())
+        try:
+            page = paginator.cursor_page(cursor)
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+def estimated_count(queryset):
+    """
+    Примерное число строк в таблице queryset без COUNT(*).
+
+    PostgreSQL хранит оценку в статистике таблицы; на других базах
+    берётся наибольший id: он читается по индексу первичного ключа
+    и отличается от числа строк только на удалённые записи.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 или 0: таблицу ещё ни разу не анализировали
+        if row and row[0] > 0:
+            return int(row[0])
+    return model._default_manager.using(queryset.db).aggregate(
+        last=Max('pk')
+    )['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который не считает строки большой таблицы.
+
+    Для запроса без фильтров число строк берётся из estimate
+    (функция без аргументов, по умолчанию estimated_count), если оно
+    не меньше exact_limit; небольшие таблицы и отфильтрованные
+    запросы считаются точно. Оценка может оказаться больше числа
+    строк, тогда последние страницы будут пустыми.
+    """
+
+    def __init__(self, object_list, per_page, estimate=None,
+                 exact_limit=10000, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.estimate = estimate or (lambda: estimated_count(object_list))
+        self.exact_limit = exact_limit
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.has_filters():
+            estimate = self.estimate()
+            if estimate >= self.exact_limit:
+                return estimate
+        return super().count
@@ -0,0 +1,21 @@
+from django import template
+
+from core.pagination import ELLIPSIS, elided_page_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_numbers(page):
+    """
+    Номера страниц вокруг текущей вместо всего page_range.
+
+    Пропуски приходят как None. У страницы, открытой по курсору,
+    номера нет, и список пуст.
+    """
+    if not page.number:
+        return []
+    return [
+        None if number == ELLIPSIS else number
+        for number in elided_page_range(page.paginator, page.number)
+    ]
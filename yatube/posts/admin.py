@@ -1,21 +1,43 @@
 from django.contrib import admin
+
+from core.admin import LargeTableAdmin
 from .models import Group, Post, Comment, Follow
+from . import counters, search
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'created', 'author', 'group')
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    # группа меняется на странице поста: поле с подсказками в каждой
+    # строке списка загружало бы свою группу отдельным запросом
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('created',)
+    # по индексу post_created_idx
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
 
+    def estimated_count(self, queryset):
+        return counters.all_posts_count()
+
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по индексу вместо LIKE '%...%' по всей таблице
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = [
         'pk',
         'author',
@@ -23,12 +45,18 @@ class CommentAdmin(admin.ModelAdmin):
         'text',
         'created'
     ]
+    list_select_related = ['author', 'post']
+    autocomplete_fields = ['author', 'post']
     readonly_fields = ['created']
+    # по индексу comment_created_idx
+    date_hierarchy = 'created'
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = [
         'user',
         'author',
     ]
+    list_select_related = ['user', 'author']
+    autocomplete_fields = ['user', 'author']
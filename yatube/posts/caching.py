@@ -0,0 +1,318 @@
+import hashlib
+import time
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+
+INDEX = 'index'
+GROUPS = 'groups'
+USERS = 'users'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+# области карточки поста: сам пост, имя автора и название группы.
+# В отличие от author_scope и group_scope их не сбрасывают новые посты
+def card_scope(post_id):
+    return f'card:{post_id}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def group_info_scope(group_id):
+    return f'group-info:{group_id}'
+
+
+# лента подписок пользователя при раскладке постов по лентам: её
+# сбрасывают раскладка, подписка, отписка и правка разложенных постов
+def timeline_scope(user_id):
+    return f'timeline:{user_id}'
+
+
+def _key(scope):
+    return f'generation:{scope}'
+
+
+def _changed_key(scope):
+    return f'changed:{scope}'
+
+
+def _initial():
+    # после вытеснения ключа поколение не должно совпасть со старым
+    return int(time.time() * 1000)
+
+
+def _generations(scopes):
+    keys = {scope: _key(scope) for scope in scopes}
+    values = cache.get_many(keys.values())
+    for key in keys.values():
+        if key not in values:
+            cache.add(key, _initial(), None)
+            values[key] = cache.get(key)
+    return {scope: values[key] for scope, key in keys.items()}
+
+
+def _version(values, scopes):
+    # имя области в версии обязательно: поколения разных авторов
+    # или групп могут совпасть, и лента одного отдалась бы другому
+    return '.'.join(f'{scope}={values[scope]}' for scope in scopes)
+
+
+def generation(*scopes):
+    """
+    Версия набора областей кэша, например INDEX и GROUPS.
+
+    Версия входит в ключ фрагмента, поэтому после bump() старые
+    фрагменты больше не читаются и просто доживают свой TTL.
+    """
+    return _version(_generations(scopes), scopes)
+
+
+def _card_scopes(post):
+    scopes = [card_scope(post.pk), user_scope(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(group_info_scope(post.group_id))
+    return scopes
+
+
+def card_versions(posts, values=None):
+    """Версии карточек постов, прочитанные из кэша одним запросом"""
+    if values is None:
+        values = _generations(post_tags(posts))
+    return {
+        post.pk: _version(values, _card_scopes(post))
+        for post in posts
+    }
+
+
+def attach_card_versions(posts):
+    """
+    Добавляет постам атрибут card_version и возвращает поколения
+    областей карточек.
+
+    Версии читаются сразу после выборки постов, до отрисовки: иначе
+    правка поста во время отрисовки сохранила бы старую карточку под
+    новой версией.
+    """
+    values = _generations(post_tags(posts))
+    versions = card_versions(posts, values)
+    for post in posts:
+        post.card_version = versions[post.pk]
+    return values
+
+
+class CardList(Sequence):
+    """
+    Посты страницы, выбираемые из базы при первом обращении.
+
+    Тогда же читаются версии карточек, поколения их областей остаются
+    в generations. Если фрагмент ленты взят из кэша, шаблон не
+    перебирает посты: нет ни запроса, ни чтения версий.
+    """
+
+    def __init__(self, object_list):
+        self._object_list = object_list
+        self.generations = {}
+
+    @cached_property
+    def _posts(self):
+        posts = list(self._object_list)
+        self.generations = attach_card_versions(posts)
+        return posts
+
+    def __getitem__(self, index):
+        return self._posts[index]
+
+    def __iter__(self):
+        return iter(self._posts)
+
+    def __len__(self):
+        return len(self._posts)
+
+
+def bump(*scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.add(_key(scope), _initial(), None)
+    cache.set_many(
+        {_changed_key(scope): int(time.time()) for scope in scopes}, None
+    )
+
+
+def changed_at(scopes):
+    """
+    Время последнего сброса областей кэша в секундах.
+
+    Если время области неизвестно (ключ вытеснен или область ещё
+    не сбрасывалась), она считается изменённой сейчас: клиент один
+    раз получит страницу целиком.
+    """
+    now = int(time.time())
+    keys = {_changed_key(scope) for scope in scopes}
+    values = cache.get_many(keys)
+    for key in keys - values.keys():
+        cache.add(key, now, None)
+        values[key] = cache.get(key, now)
+    return max(values.values(), default=now)
+
+
+def post_scopes(author_id, group_id):
+    scopes = [INDEX, author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+class FeedCacheMixin:
+    """Передаёт в шаблон версию ленты для ключа фрагментного кэша"""
+    feed_scopes = (INDEX,)
+
+    def get_feed_scopes(self):
+        return self.feed_scopes
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # названия групп и имена авторов есть на любой странице ленты
+        context['feed_generation'] = generation(
+            GROUPS, USERS, *self.get_feed_scopes()
+        )
+        context['feed_cache_timeout'] = settings.FEED_CACHE_TIMEOUT
+        return context
+
+
+class CardCacheMixin:
+    """Готовит посты страницы к кэшированию карточек по отдельности"""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context['page_obj']
+        page.object_list = CardList(page.object_list)
+        versions = getattr(self, 'page_cache_versions', None)
+        if versions is not None:
+            # страница гостя помечается областями своих карточек,
+            # поэтому посты выбираются сразу, до отрисовки
+            len(page.object_list)
+            versions.update(page.object_list.generations)
+        context['card_cache_timeout'] = settings.FEED_CACHE_TIMEOUT
+        return context
+
+
+def post_tags(posts):
+    """Области кэша, от которых зависят карточки постов"""
+    return {scope for post in posts for scope in _card_scopes(post)}
+
+
+def tag_versions(tags):
+    """Текущие версии областей кэша, которыми помечена страница"""
+    return _generations(tags)
+
+
+class PageCacheMixin:
+    """
+    Помечает ответ версиями областей кэша, от которых зависит страница.
+
+    Страница помечается только областями объектов, которые на ней
+    выведены: лентой, её группой или автором и карточками постов
+    (CardCacheMixin). Общие GROUPS и USERS не используются — иначе
+    любое сохранение пользователя или группы сбрасывало бы все
+    страницы.
+
+    Версии читаются до отрисовки: области ленты — до выборки постов,
+    области карточек — сразу после. Если область сбросят, пока
+    страница строится, страница сохранится под старой версией и
+    устареет сразу, а не проживёт весь PAGE_CACHE_TIMEOUT.
+    """
+    page_cache = True
+
+    def get_page_cache_base_tags(self):
+        """Области, известные до любых запросов к базе"""
+        return []
+
+    def get_page_cache_tags(self):
+        """Области, известные до выборки постов страницы"""
+        return self.get_feed_scopes()
+
+    def dispatch(self, request, *args, **kwargs):
+        self.page_cache_versions = None
+        # страницы кэшируются только для гостей
+        if not request.user.is_authenticated:
+            self.page_cache_versions = tag_versions(
+                self.get_page_cache_base_tags()
+            )
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        if self.page_cache_versions is not None:
+            tags = set(self.get_page_cache_tags())
+            self.page_cache_versions.update(
+                tag_versions(tags - self.page_cache_versions.keys())
+            )
+        return super().get(request, *args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response.cache_versions = self.page_cache_versions
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 Not Modified, если страница у клиента не устарела.
+
+    Валидаторы строятся из поколений областей кэша до выборки постов
+    и отрисовки шаблона: ETag — из версий областей, адреса страницы
+    и пользователя, Last-Modified — из времени последнего сброса
+    областей. Last-Modified отдаётся только гостям: у пользователя
+    страница меняется и без сброса областей, например после входа.
+    """
+
+    def get_validator_scopes(self):
+        return [GROUPS, USERS, *self.get_feed_scopes()]
+
+    def get_etag_extra(self):
+        """Данные страницы, которые не покрываются областями кэша"""
+        return []
+
+    def get_validators(self):
+        scopes = self.get_validator_scopes()
+        user = self.request.user
+        parts = [
+            self.request.get_full_path(),
+            str(user.pk or ''),
+            generation(*scopes),
+            *map(str, self.get_etag_extra()),
+        ]
+        etag = quote_etag(
+            hashlib.md5('\n'.join(parts).encode()).hexdigest()
+        )
+        last_modified = None
+        if not user.is_authenticated:
+            last_modified = changed_at(scopes)
+        return etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
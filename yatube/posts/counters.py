@@ -0,0 +1,214 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Counter, Follow, Post
+
+ALL_POSTS = 'posts'
+FOLLOWERS = 'followers'
+# не счётчик, а отметка автора, чьи посты пропускались при раскладке
+MERGED = 'merged'
+
+
+def author_key(author_id):
+    return f'posts:author:{author_id}'
+
+
+def group_key(group_id):
+    return f'posts:group:{group_id}'
+
+
+def followers_key(author_id):
+    return f'{FOLLOWERS}:author:{author_id}'
+
+
+def get_counts(keys, compute):
+    """
+    Значения счётчиков по списку ключей.
+
+    Отсутствующие счётчики один раз считаются функцией compute
+    (список ключей -> {ключ: значение}) и сохраняются, дальше
+    их поддерживают сигналы.
+
+    Строка счётчика создаётся до подсчёта, а посчитанное значение
+    добавляется к ней: change() во время подсчёта попадает в строку
+    и не теряется. Значение добавляет только тот, кто создал строку.
+    """
+    counts = dict(
+        Counter.objects.filter(key__in=keys).values_list('key', 'value')
+    )
+    missing = [key for key in keys if key not in counts]
+    if missing:
+        created = [
+            key for key in missing
+            if Counter.objects.get_or_create(key=key)[1]
+        ]
+        computed = compute(missing)
+        with transaction.atomic():
+            for key in created:
+                Counter.objects.filter(key=key).update(
+                    value=F('value') + computed.get(key, 0)
+                )
+        counts.update((key, computed.get(key, 0)) for key in missing)
+    return counts
+
+
+def all_posts_count():
+    return get_counts(
+        [ALL_POSTS], lambda keys: {ALL_POSTS: Post.objects.count()}
+    )[ALL_POSTS]
+
+
+def group_posts_count(group_id):
+    key = group_key(group_id)
+    return get_counts([key], lambda keys: {
+        key: Post.objects.filter(group_id=group_id).count()
+    })[key]
+
+
+def author_posts_count(author_id):
+    return authors_posts_count([author_id])
+
+
+def authors_posts_count(author_ids):
+    """Суммарное число постов одного или нескольких авторов"""
+    authors = {author_key(author_id): author_id for author_id in author_ids}
+
+    def compute(keys):
+        return {
+            author_key(author_id): value
+            for author_id, value in Post.objects.filter(
+                author_id__in=[authors[key] for key in keys]
+            ).order_by().values_list('author_id').annotate(Count('pk'))
+        }
+
+    return sum(get_counts(list(authors), compute).values())
+
+
+def merged_key(author_id):
+    return f'{MERGED}:author:{author_id}'
+
+
+def followers_changed(author_id, delta):
+    """Обновляет счётчик подписчиков, создавая его при первой подписке"""
+    key = followers_key(author_id)
+    if not Counter.objects.filter(key=key).update(value=F('value') + delta):
+        Counter.objects.get_or_create(key=key, defaults={
+            'value': Follow.objects.filter(author_id=author_id).count()
+        })
+
+
+def followers_count(author_id):
+    key = followers_key(author_id)
+    return get_counts([key], lambda keys: {
+        key: Follow.objects.filter(author_id=author_id).count()
+    })[key]
+
+
+def authors_with_followers_over(limit):
+    """Авторы, у которых больше limit подписчиков"""
+    prefix = followers_key('')
+    return [
+        int(key[len(prefix):]) for key in Counter.objects.filter(
+            key__startswith=prefix, value__gt=limit
+        ).values_list('key', flat=True)
+    ]
+
+
+def mark_merged(author_id):
+    """Отмечает автора, чьи посты не попали в ленты подписок"""
+    Counter.objects.get_or_create(key=merged_key(author_id))
+
+
+def merged_authors():
+    """Авторы с отметкой mark_merged"""
+    prefix = merged_key('')
+    return [
+        int(key[len(prefix):]) for key in Counter.objects.filter(
+            key__startswith=prefix
+        ).values_list('key', flat=True)
+    ]
+
+
+def clear_merged():
+    Counter.objects.filter(key__startswith=merged_key('')).delete()
+
+
+def post_keys(author_id, group_id):
+    keys = [ALL_POSTS, author_key(author_id)]
+    if group_id is not None:
+        keys.append(group_key(group_id))
+    return keys
+
+
+def change(keys, delta):
+    """Изменить существующие счётчики; отсутствующие посчитаются при чтении"""
+    if keys and delta:
+        Counter.objects.filter(key__in=keys).update(value=F('value') + delta)
+
+
+def post_counter_keys():
+    """Ключи сохранённых счётчиков постов"""
+    return set(Counter.objects.filter(
+        key__startswith=ALL_POSTS
+    ).values_list('key', flat=True))
+
+
+# SQLite не вставляет больше 500 строк одним INSERT ... SELECT UNION
+def rebuild(batch_size=500):
+    """Пересчитать все счётчики группирующими запросами"""
+    posts = Post.objects.order_by()
+    rows = [Counter(key=ALL_POSTS, value=posts.count())]
+    rows.extend(
+        Counter(key=author_key(author_id), value=value)
+        for author_id, value in posts.values_list('author_id').annotate(
+            Count('pk')
+        )
+    )
+    rows.extend(
+        Counter(key=group_key(group_id), value=value)
+        for group_id, value in posts.filter(
+            group__isnull=False
+        ).values_list('group_id').annotate(Count('pk'))
+    )
+    rows.extend(
+        Counter(key=followers_key(author_id), value=value)
+        for author_id, value in Follow.objects.order_by().values_list(
+            'author_id'
+        ).annotate(Count('pk'))
+    )
+    with transaction.atomic():
+        Counter.objects.filter(key__startswith=ALL_POSTS).delete()
+        Counter.objects.filter(key__startswith=FOLLOWERS).delete()
+        Counter.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def comments_changed(post_id, delta):
+    """Изменяет Post.comments_count одним UPDATE, без гонки при чтении"""
+    if post_id is not None and delta:
+        Post.objects.filter(pk=post_id).update(
+            comments_count=F('comments_count') + delta
+        )
+
+
+def _actual_comments_count():
+    counts = Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+        'post'
+    ).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def repair_comment_counts(batch_size=1000):
+    """
+    Пересчитывает comments_count у постов, где он разошёлся
+    с таблицей комментариев. Возвращает id исправленных постов.
+    """
+    broken = list(Post.objects.order_by().annotate(
+        actual=_actual_comments_count()
+    ).exclude(comments_count=F('actual')).values_list('pk', flat=True))
+    for start in range(0, len(broken), batch_size):
+        Post.objects.filter(pk__in=broken[start:start + batch_size]).update(
+            comments_count=_actual_comments_count()
+        )
+    return broken
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from . import uploads
 from .models import Post, Comment
 
 
@@ -22,6 +25,23 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('необходимо заполнить поле')
         return data
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # без новой загрузки здесь уже сохранённый файл поста
+        if isinstance(image, UploadedFile):
+            return uploads.normalize_image(image)
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = self.files.get('image')
+        if getattr(upload, 'too_large', False):
+            # ImageField уже отверг обрезанный при загрузке файл как
+            # битое изображение; показываем настоящую причину
+            self.errors.pop('image', None)
+            self.add_error('image', uploads.too_large_error())
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
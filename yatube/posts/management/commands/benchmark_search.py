@@ -0,0 +1,83 @@
+import statistics
+import time
+from collections import Counter
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from posts import search
+from posts.models import Post
+
+SAMPLE_POSTS = 500
+
+
+def sample_queries(count):
+    """Самые частые слова последних постов и одно редкое"""
+    terms = Counter()
+    texts = Post.objects.order_by('-created').values_list(
+        'text', flat=True
+    )[:SAMPLE_POSTS]
+    for text in texts:
+        terms.update(search.tokenize(text))
+    common = [term for term, _ in terms.most_common(count)]
+    rare = [term for term, _ in terms.most_common()[-1:]]
+    return common + [term for term in rare if term not in common]
+
+
+def icontains_ids(query, limit):
+    # так же ищет админка Django: каждое слово через LIKE '%...%'
+    condition = reduce(and_, (
+        Q(text__icontains=word) for word in query.split()
+    ))
+    return list(Post.objects.filter(condition).values_list(
+        'pk', flat=True
+    )[:limit])
+
+
+def index_ids(query, limit):
+    return search.search(query).ids
+
+
+def measure(find, query, repeat, limit):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = find(query, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(found)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время поиска постов по индексу и через icontains'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*',
+            help='Запросы; по умолчанию частые слова последних постов',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--sample', type=int, default=3)
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or sample_queries(options['sample'])
+        if not queries:
+            raise CommandError('Нет постов, из которых взять запросы')
+        limit = settings.POST_SEARCH_MAX_RESULTS
+        index = search.get_index().name
+        for query in queries:
+            scan_ms, scan_found = measure(
+                icontains_ids, query, options['repeat'], limit
+            )
+            index_ms, index_found = measure(
+                index_ids, query, options['repeat'], limit
+            )
+            self.stdout.write(
+                f'{query!r}: icontains {scan_ms:.2f} мс '
+                f'(найдено {scan_found}), {index} {index_ms:.2f} мс '
+                f'(найдено {index_found})'
+            )
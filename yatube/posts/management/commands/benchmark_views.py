@@ -0,0 +1,300 @@
+import json
+import statistics
+import time
+from collections import namedtuple
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import seeding
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# один сценарий на каждое имя из posts/urls.py. prepare — адрес,
+# который запрашивается без замера перед каждым запросом сценария;
+# writes — сценарий меняет данные, и его изменения откатываются
+Case = namedtuple(
+    'Case', 'name method url user data prepare writes',
+    defaults=(None, False),
+)
+
+
+def dataset():
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def cases():
+    """
+    Сценарии для всех адресов приложения posts.
+
+    Берутся самые нагруженные объекты: группа и автор с наибольшим
+    числом постов, подписчик с наибольшим числом подписок и самый
+    обсуждаемый пост.
+    """
+    group = Group.objects.annotate(
+        size=Count('group_posts')
+    ).order_by('-size').first()
+    author = User.objects.annotate(
+        size=Count('posts')
+    ).order_by('-size').first()
+    follower = User.objects.annotate(
+        size=Count('follower')
+    ).order_by('-size').first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    if not (group and author and follower and post):
+        raise CommandError(
+            'Нет данных для сценариев: запустите с --seed-posts'
+        )
+    post_args = [post.pk]
+    # перед каждой отпиской подписка и наоборот: каждый замеренный
+    # запрос действительно пишет в базу
+    target = post.author if post.author != follower else author
+    unfollow = reverse('posts:profile_unfollow', args=[target.username])
+    follow = reverse('posts:profile_follow', args=[target.username])
+    return [
+        Case('index', 'get', reverse('posts:index'), None, None),
+        Case(
+            'group_list', 'get',
+            reverse('posts:group_list', args=[group.slug]), None, None,
+        ),
+        Case(
+            'profile', 'get',
+            reverse('posts:profile', args=[author.username]), None, None,
+        ),
+        Case(
+            'post_detail', 'get',
+            reverse('posts:post_detail', args=post_args), None, None,
+        ),
+        Case(
+            'comments', 'get',
+            reverse('posts:comments', args=post_args), None,
+            {'format': 'json'},
+        ),
+        Case(
+            'search', 'get', reverse('posts:search'), None,
+            {'q': seeding.WORDS[0]},
+        ),
+        Case('post_create', 'get', reverse('posts:post_create'), author,
+             None),
+        Case(
+            'post_edit', 'get',
+            reverse('posts:post_edit', args=post_args), post.author, None,
+        ),
+        Case(
+            'add_comment', 'post',
+            reverse('posts:add_comment', args=post_args), follower,
+            {'text': 'Комментарий из бенчмарка'}, writes=True,
+        ),
+        Case('follow_index', 'get', reverse('posts:follow_index'),
+             follower, None),
+        Case(
+            'profile_unfollow', 'get', unfollow, follower, None,
+            prepare=follow, writes=True,
+        ),
+        Case(
+            'profile_follow', 'get', follow, follower, None,
+            prepare=unfollow, writes=True,
+        ),
+    ]
+
+
+def percentile(values, fraction):
+    """Значение из отсортированного списка по доле (nearest-rank)"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(case, requests, warmup, cold=False):
+    """
+    Замеряет сценарий. Изменения пишущих сценариев откатываются:
+    данные не расходятся между прогонами и с результатом --compare
+    """
+    if not case.writes:
+        return _measure(case, requests, warmup, cold)
+    with transaction.atomic():
+        result = _measure(case, requests, warmup, cold)
+        transaction.set_rollback(True)
+    return result
+
+
+def _measure(case, requests, warmup, cold):
+    client = Client()
+    if case.user is not None:
+        client.force_login(case.user)
+    send = getattr(client, case.method)
+    for _ in range(warmup):
+        if case.prepare:
+            client.get(case.prepare)
+        send(case.url, case.data)
+    timings, queries = [], []
+    for _ in range(requests):
+        if case.prepare:
+            client.get(case.prepare)
+        if cold:
+            cache.clear()
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            started = time.perf_counter()
+            response = send(case.url, case.data)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(sum(len(capture) for capture in captured))
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{case.name}: {case.url} ответил {response.status_code}'
+            )
+    timings.sort()
+    return {
+        'method': case.method.upper(),
+        'url': case.url,
+        'status': response.status_code,
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(timings[-1], 3),
+        'queries': int(statistics.median(queries)),
+    }
+
+
+def regressions(baseline, current, tolerance, min_ms):
+    """
+    Сценарии, где p95 вырос больше чем в tolerance раз (и хотя бы
+    на min_ms) или стало больше запросов к базе
+    """
+    found = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        slower = (
+            result['p95_ms'] > before['p95_ms'] * tolerance
+            and result['p95_ms'] - before['p95_ms'] >= min_ms
+        )
+        if slower:
+            found.append(
+                f'{name}: p95 {before["p95_ms"]:.1f} → '
+                f'{result["p95_ms"]:.1f} мс'
+            )
+        if result['queries'] > before['queries']:
+            found.append(
+                f'{name}: запросов {before["queries"]} → '
+                f'{result["queries"]}'
+            )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержки и число запросов к базе для каждого адреса '
+        'posts/urls.py и сохраняет результат в JSON. С --seed-posts '
+        'сначала создаёт синтетические данные в текущей базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-posts', type=int, default=0,
+            help='Создать столько постов (и пропорционально авторов, '
+                 'групп, комментариев и подписок) перед замером',
+        )
+        parser.add_argument('--seed-users', type=int)
+        parser.add_argument('--seed-comments', type=int)
+        parser.add_argument('--seed-follows', type=int)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--only', action='append',
+            help='Замерить только эти сценарии, можно несколько',
+        )
+        parser.add_argument(
+            '--output', help='Файл для результата; по умолчанию stdout',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Прошлый результат: при регрессии команда завершится '
+                 'с ошибкой',
+        )
+        parser.add_argument('--tolerance', type=float, default=1.25)
+        parser.add_argument(
+            '--min-ms', type=float, default=1,
+            help='Меньший прирост p95 не считается регрессией',
+        )
+
+    def handle(self, *args, **options):
+        if options['seed_posts']:
+            steps = seeding.seed(
+                options['seed_posts'],
+                users=options['seed_users'],
+                comments=options['seed_comments'],
+                follows=options['seed_follows'],
+                random_seed=options['random_seed'],
+            )
+            self.stderr.write(
+                f'Данные созданы за '
+                f'{sum(step.seconds for step in steps):.1f} с'
+            )
+        selected = [
+            case for case in cases()
+            if not options['only'] or case.name in options['only']
+        ]
+        result = {
+            'created': timezone.now().isoformat(),
+            'database': {
+                'vendor': connections['default'].vendor,
+                'profile': settings.DB_PROFILE,
+            },
+            'dataset': dataset(),
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'results': {},
+        }
+        for case in selected:
+            result['results'][case.name] = measure(
+                case, options['requests'], options['warmup'],
+                options['cold'],
+            )
+            self.stderr.write(
+                f'{case.name}: p50 '
+                f'{result["results"][case.name]["p50_ms"]:.1f} мс, '
+                f'запросов {result["results"][case.name]["queries"]}'
+            )
+        report = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            found = regressions(
+                baseline, result, options['tolerance'], options['min_ms']
+            )
+            if found:
+                raise CommandError(
+                    'Регрессии относительно '
+                    f'{options["compare"]}:\n' + '\n'.join(found)
+                )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scan',
+            action='store_true',
+            help='Искать и неучтённые файлы в каталоге изображений',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы и ссылки моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Сначала пересчитать ссылки по таблице постов',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            media.rebuild()
+        names = media.collect(
+            options['min_age'], options['scan'], options['dry_run']
+        )
+        if options['verbosity'] > 1 or options['dry_run']:
+            for name in names:
+                self.stdout.write(name)
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{action} файлов: {len(names)}'))
@@ -0,0 +1,141 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.pagination import NEXT, PREVIOUS, CursorPaginator
+from posts import timelines
+from posts.models import Comment, Follow, Post
+from posts.views import POSTS_AMOUNT
+
+User = get_user_model()
+
+# признаки плохого плана для каждой СУБД: полный просмотр таблицы
+# и сортировка во временной структуре
+PLAN_PROBLEMS = {
+    'sqlite': {
+        'full scan': re.compile(r'\bSCAN (TABLE )?\S+$', re.M),
+        'temp sort': re.compile(r'USE TEMP B-TREE FOR .*ORDER BY'),
+    },
+    'postgresql': {
+        'full scan': re.compile(r'Seq Scan on'),
+        'temp sort': re.compile(r'^\s*(->\s*)?(Incremental )?Sort\b', re.M),
+    },
+}
+
+# просмотр всего индекса подряд: для запроса с WHERE это проверка
+# условия по каждой строке, а не чтение диапазона. В PostgreSQL
+# остаток условия курсора всегда виден как Filter, поэтому там
+# достаточно проверки KEY_RANGE
+INDEX_SCAN = {
+    'sqlite': re.compile(r'\bSCAN \S+ USING (COVERING )?INDEX', re.M),
+}
+
+# переход по курсору должен читать диапазон индекса по дате
+KEY_RANGE = {
+    'sqlite': re.compile(r'\bSEARCH .*\bcreated[<>]\?'),
+    'postgresql': re.compile(r'Index Cond: .*\bcreated\b"? [<>]'),
+}
+
+
+def feed_querysets():
+    """
+    Запросы лент и комментариев в том виде, в каком их строят
+    представления.
+
+    План не зависит от конкретных значений, поэтому используются
+    фиктивные id. Для каждой ленты проверяется первая страница
+    и переходы по курсору в обе стороны. Третий элемент — проблемы,
+    которые для этого запроса ожидаемы, четвёртый — обязан ли запрос
+    читать диапазон индекса по дате.
+    """
+    user = User(pk=0)
+    feeds = [
+        ('index', Post.objects.feed(), None, ()),
+        ('group', Post.objects.feed().filter(group_id=0), None, ()),
+        ('profile', Post.objects.feed().filter(author_id=0), None, ()),
+        (
+            'follow (read)',
+            Post.objects.feed().filter(
+                author__in=Follow.objects.filter(user=user).values_list(
+                    'author', flat=True
+                )
+            ),
+            None,
+            # посты многих авторов нельзя прочитать одним диапазоном
+            # индекса; для этого есть режим FOLLOW_TIMELINE = 'write'
+            ('temp sort',),
+        ),
+    ]
+    with override_settings(FOLLOW_TIMELINE=timelines.WRITE):
+        feed = timelines.follow_feed(user)
+    feeds.append(('follow (timeline)', feed.posts, feed.key_fields, ()))
+    feeds.append((
+        'comments', Comment.objects.for_display().filter(post_id=0), None, ()
+    ))
+
+    now = timezone.now()
+    for name, queryset, key_fields, allowed in feeds:
+        paginator = CursorPaginator(
+            queryset, POSTS_AMOUNT, count=0, key_fields=key_fields
+        )
+        limit = POSTS_AMOUNT + 1
+        yield name, paginator.object_list[:POSTS_AMOUNT], allowed, False
+        yield (
+            f'{name}, cursor',
+            paginator.seek(NEXT, now, 0)[:limit],
+            allowed,
+            True,
+        )
+        yield (
+            f'{name}, previous cursor',
+            paginator.seek(PREVIOUS, now, 0)[:limit],
+            allowed,
+            True,
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов лент и завершается ошибкой, '
+        'если запрос читает таблицу целиком или сортирует без индекса'
+    )
+
+    def handle(self, *args, **options):
+        problems = PLAN_PROBLEMS.get(connection.vendor)
+        if problems is None:
+            raise CommandError(
+                f'Проверка планов для {connection.vendor} не поддерживается'
+            )
+        failed = []
+        vendor = connection.vendor
+        for name, queryset, allowed, bounded in feed_querysets():
+            plan = queryset.explain()
+            found = [
+                problem for problem, pattern in problems.items()
+                if pattern.search(plan)
+            ]
+            index_scan = INDEX_SCAN.get(vendor)
+            if queryset.query.where and index_scan and index_scan.search(
+                plan
+            ):
+                found.append('filtered index scan')
+            if bounded and not KEY_RANGE[vendor].search(plan):
+                found.append('no key range')
+            found = [problem for problem in found if problem not in allowed]
+            if found:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: {", ".join(found)}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            if found or options['verbosity'] > 1:
+                self.stdout.write(plan)
+        if failed:
+            raise CommandError(
+                f'Запросы без подходящего индекса: {", ".join(failed)}'
+            )
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для изображений из очереди заданий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help='Количество процессов для генерации',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=settings.THUMBNAIL_BATCH,
+            help='Сколько заданий забирать из очереди за раз',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, если очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = thumbnails.process(
+                options['batch'], options['workers']
+            )
+            if done or failed:
+                self.stdout.write(
+                    f'Готово: {done}, с ошибкой: {failed}'
+                )
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import caching, counters
+
+
+def counted_scopes(keys):
+    """Области кэша страниц, на которых выводятся счётчики keys"""
+    prefixes = {
+        counters.author_key(''): caching.author_scope,
+        counters.group_key(''): caching.group_scope,
+    }
+    scopes = set()
+    for key in keys:
+        if key == counters.ALL_POSTS:
+            scopes.add(caching.INDEX)
+        for prefix, scope in prefixes.items():
+            if key.startswith(prefix):
+                scopes.add(scope(int(key[len(prefix):])))
+    return scopes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов'
+
+    def handle(self, *args, **options):
+        # страницы выводят и счётчики, которые пересчёт удалит
+        keys = counters.post_counter_keys()
+        rows = counters.rebuild()
+        keys |= counters.post_counter_keys()
+        caching.bump(*counted_scopes(keys))
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано счётчиков: {rows}'
+        ))
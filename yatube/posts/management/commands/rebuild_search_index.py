@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс постов заново'
+
+    def handle(self, *args, **options):
+        index = search.get_index()
+        rows = index.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов ({index.name}): {rows}'
+        ))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import counters, timelines
+
+
+class Command(BaseCommand):
+    help = 'Заполняет предвычисленные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trim-only',
+            action='store_true',
+            help='Только обрезать ленты до FOLLOW_TIMELINE_LENGTH',
+        )
+
+    def handle(self, *args, **options):
+        if options['trim_only']:
+            timelines.trim_all()
+            self.stdout.write(self.style.SUCCESS('Ленты обрезаны'))
+            return
+        if settings.FOLLOW_TIMELINE == timelines.HYBRID:
+            # какие авторы не раскладываются, решают счётчики подписчиков
+            counters.rebuild()
+        timelines.rebuild()
+        self.stdout.write(self.style.SUCCESS('Ленты подписок заполнены'))
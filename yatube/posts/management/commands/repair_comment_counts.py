@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import caching, counters, timelines
+from posts.models import Post
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число комментариев у постов, где оно разошлось'
+
+    def handle(self, *args, **options):
+        repaired = counters.repair_comment_counts(BATCH_SIZE)
+        # карточки с неверным числом могли попасть в кэш вместе
+        # с лентами, где они выведены
+        scopes = {caching.card_scope(pk) for pk in repaired}
+        authors = set()
+        for start in range(0, len(repaired), BATCH_SIZE):
+            refs = Post.objects.filter(
+                pk__in=repaired[start:start + BATCH_SIZE]
+            ).order_by().values_list('author_id', 'group_id').distinct()
+            for author_id, group_id in refs:
+                scopes.update(caching.post_scopes(author_id, group_id))
+                authors.add(author_id)
+        caching.bump(*scopes)
+        if timelines.fan_out_enabled():
+            for author_id in authors:
+                timelines.posts_changed(author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {len(repaired)}'
+        ))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетические данные: пользователей, группы, посты, '
+        'комментарии и подписки с неравномерной популярностью авторов, '
+        'групп и постов. Выводит скорость вставки по каждой модели'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('posts', type=int, help='Сколько постов создать')
+        parser.add_argument(
+            '--users', type=int, help='По умолчанию один на 20 постов',
+        )
+        parser.add_argument(
+            '--groups', type=int, help='По умолчанию одна на 1000 постов',
+        )
+        parser.add_argument(
+            '--comments', type=int, help='По умолчанию столько же, '
+                                         'сколько постов',
+        )
+        parser.add_argument(
+            '--follows', type=int, help='По умолчанию 10 на пользователя',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=seeding.BATCH_SIZE,
+            help='Строк в одной транзакции',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=seeding.SKEW,
+            help='Показатель закона Ципфа: чем больше, тем сильнее '
+                 'перекос в пользу популярных авторов, групп и постов',
+        )
+        parser.add_argument('--random-seed', type=int)
+
+    def handle(self, *args, **options):
+        if options['posts'] < 0 or options['batch_size'] < 1:
+            raise CommandError(
+                'Число постов не может быть отрицательным, а размер '
+                'пачки — меньше 1'
+            )
+        steps = seeding.seed(
+            options['posts'],
+            users=options['users'],
+            groups=options['groups'],
+            comments=options['comments'],
+            follows=options['follows'],
+            batch_size=options['batch_size'],
+            exponent=options['skew'],
+            random_seed=options['random_seed'],
+        )
+        for step in steps:
+            if step.rows is None:
+                self.stdout.write(f'{step.name}: {step.seconds:.1f} с')
+                continue
+            rate = step.rows / step.seconds if step.seconds else 0
+            self.stdout.write(
+                f'{step.name}: {step.rows} строк за {step.seconds:.1f} с '
+                f'({rate:.0f} строк/с)'
+            )
+        rows = sum(step.rows or 0 for step in steps)
+        seconds = sum(step.seconds for step in steps)
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {rows} строк за {seconds:.1f} с '
+            f'({rows / seconds if seconds else 0:.0f} строк/с)'
+        ))
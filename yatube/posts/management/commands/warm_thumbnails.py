@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры для всех загруженных изображений постов. '
+        'Готовые пропускаются, поэтому прерванный прогрев можно '
+        'просто запустить заново'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help='Количество процессов для генерации',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=8,
+            help='Сколько изображений передавать процессу за раз',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Не пропускать изображения с готовыми миниатюрами',
+        )
+
+    def handle(self, *args, **options):
+        names = list(thumbnails.source_images())
+        total = len(names)
+        if not options['force']:
+            names = [
+                name for name in names if not thumbnails.is_ready(name)
+            ]
+        self.stdout.write(
+            f'Изображений: {total}, уже готово: {total - len(names)}'
+        )
+
+        started = time.monotonic()
+        done = failed = 0
+        results = thumbnails.run_all(
+            names, options['workers'], options['chunk_size']
+        )
+        for name, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                done += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(name)
+        elapsed = time.monotonic() - started
+        rate = (done + failed) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, с ошибкой: {failed} '
+            f'за {elapsed:.1f} с ({rate:.1f} изображений/с)'
+        ))
@@ -0,0 +1,153 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import MediaFile, Post
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+
+def source_file(file_):
+    """Оригинал изображения поста в виде, понятном sorl"""
+    return ImageFile(getattr(file_, 'name', file_), image_storage)
+
+
+def acquire(name):
+    """
+    Добавляет ссылку на файл.
+
+    Возвращает True для первой ссылки: только тогда для файла нужно
+    создавать миниатюры, у дубликата они уже есть.
+    """
+    media, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'references': 1}
+    )
+    if created:
+        return True
+    MediaFile.objects.filter(pk=media.pk).update(
+        references=F('references') + 1, updated=timezone.now()
+    )
+    return media.references <= 0
+
+
+def release(name):
+    MediaFile.objects.filter(name=name).update(
+        references=F('references') - 1, updated=timezone.now()
+    )
+
+
+def rebuild():
+    """Пересчитывает ссылки по таблице постов"""
+    references = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(references=Count('pk'))
+    with transaction.atomic():
+        MediaFile.objects.all().delete()
+        MediaFile.objects.bulk_create(
+            MediaFile(name=row['image'], references=row['references'])
+            for row in references.iterator()
+        )
+
+
+def delete_file(name):
+    """Удаляет оригинал вместе с миниатюрами и записями sorl"""
+    try:
+        default.backend.delete(source_file(name))
+    except SuspiciousFileOperation:
+        # имя вне MEDIA_ROOT: такой файл хранилищу не принадлежит
+        logger.warning('Пропущен файл вне MEDIA_ROOT: %s', name)
+        return False
+    return True
+
+
+def _unreferenced_filter(min_age):
+    return {
+        'references__lte': 0,
+        'updated__lt': timezone.now() - timedelta(seconds=min_age),
+    }
+
+
+def unreferenced(min_age):
+    """
+    Файлы без ссылок, которые больше ни одному посту не нужны.
+
+    Ссылки, обнулённые меньше min_age секунд назад, пропускаются:
+    файл может быть загружен заново прямо сейчас.
+    """
+    names = list(MediaFile.objects.filter(
+        **_unreferenced_filter(min_age)
+    ).values_list('name', flat=True))
+    # счётчик мог разойтись с таблицей постов: перепроверяем по ней
+    used = set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+    return [name for name in names if name not in used]
+
+
+def orphans(min_age):
+    """
+    Файлы в каталоге изображений, на которые нет ни одного поста.
+
+    Это файлы, загруженные до подсчёта ссылок, и остатки прерванных
+    загрузок. Файлы моложе min_age секунд пропускаются: пост для них
+    может ещё сохраняться.
+    """
+    upload_to = Post._meta.get_field('image').upload_to
+    root = image_storage.path(upload_to)
+    used = set(Post.objects.exclude(image='').values_list(
+        'image', flat=True
+    ).iterator())
+    deadline = time.time() - min_age
+    for path, _, files in os.walk(root):
+        for file_name in files:
+            full_path = os.path.join(path, file_name)
+            name = os.path.relpath(
+                full_path, image_storage.location
+            ).replace(os.sep, '/')
+            if name not in used and os.path.getmtime(full_path) < deadline:
+                yield name
+
+
+def collect(min_age, scan=False, dry_run=False):
+    """
+    Удаляет файлы без ссылок; при scan ещё и неучтённые файлы.
+
+    Возвращает список удалённых (или, при dry_run, найденных) имён.
+    """
+    names = unreferenced(min_age)
+    if scan:
+        known = set(names)
+        names += [name for name in orphans(min_age) if name not in known]
+    if dry_run:
+        return names
+    return [name for name in names if _remove(name, min_age)]
+
+
+def _remove(name, min_age):
+    """
+    Удаляет файл, если ссылок на него так и не появилось.
+
+    Между выборкой имён и удалением пост мог снова сослаться на файл,
+    поэтому запись удаляется с тем же условием, а файл — только если
+    запись действительно удалена. Для неучтённых файлов проверяются
+    таблица постов и отсутствие записи.
+    """
+    with transaction.atomic():
+        removed, _ = MediaFile.objects.filter(
+            name=name, **_unreferenced_filter(min_age)
+        ).delete()
+        if not removed and (
+            MediaFile.objects.filter(name=name).exists()
+            or Post.objects.filter(image=name).exists()
+        ):
+            return False
+        return delete_file(name)
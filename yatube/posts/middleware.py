@@ -0,0 +1,89 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from core import metrics
+from . import caching
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def _key(request):
+    url = request.build_absolute_uri().encode()
+    return f'page:{hashlib.md5(url).hexdigest()}'
+
+
+class PageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных посетителей.
+
+    Кэшируются ответы представлений с page_cache = True, которые
+    приложили версии своих областей кэша (caching.PageCacheMixin).
+    Версии хранятся вместе со страницей; страница отдаётся, пока ни
+    одну из областей не сбросили сигналы, то есть пока не изменились
+    её посты, их авторы и группы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_page_cache_key', None)
+        if key and self._cacheable(request, response):
+            cache.set(key, {
+                'versions': response.cache_versions,
+                'status': response.status_code,
+                'headers': list(response.items()),
+                'content': response.content,
+            }, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if (
+            not getattr(view, 'page_cache', False)
+            or request.method not in CACHEABLE_METHODS
+            or request.user.is_authenticated
+        ):
+            return None
+        request._page_cache_key = _key(request)
+        entry = cache.get(request._page_cache_key)
+        if entry is None or caching.tag_versions(
+            entry['versions']
+        ) != entry['versions']:
+            metrics.incr('page_cache.miss')
+            return None
+        metrics.incr('page_cache.hit')
+        request._page_cache_key = None
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        # валидаторы сохранённой страницы ещё действительны
+        last_modified = response.get('Last-Modified')
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=last_modified and parse_http_date_safe(
+                last_modified
+            ),
+            response=response,
+        )
+
+    @staticmethod
+    def _cacheable(request, response):
+        # в странице токен CSRF или новая сессия: она личная
+        return (
+            request.method == 'GET'
+            and response.status_code == 200
+            and getattr(response, 'cache_versions', None) is not None
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+            and not getattr(
+                getattr(request, 'session', None), 'modified', False
+            )
+        )
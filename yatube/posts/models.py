@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import DateModel
+from .storage import image_storage
 
 User = get_user_model()
 
@@ -18,6 +19,27 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    # поля, которые выводятся в карточке поста в лентах
+    FEED_FIELDS = (
+        'text',
+        'created',
+        'image',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__slug',
+        'group__title',
+        'comments_count',
+    )
+
+    def feed(self):
+        """Посты для ленты вместе с автором и группой одним запросом"""
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS
+        )
+
+
 class Post(DateModel):
     text = models.TextField(
         verbose_name='Текст',
@@ -42,18 +64,50 @@ class Post(DateModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True
     )
+    # поддерживается сигналами комментариев,
+    # пересчитывается командой repair_comment_counts
+    comments_count = models.IntegerField(
+        'Комментариев', default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # по индексу на каждую ленту: сортировка (created, id)
+        # и фильтр по автору или группе
+        indexes = [
+            models.Index(
+                fields=['created', 'id'],
+                name='post_created_idx'
+            ),
+            models.Index(
+                fields=['author', 'created', 'id'],
+                name='post_author_created_idx'
+            ),
+            models.Index(
+                fields=['group', 'created', 'id'],
+                name='post_group_created_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    def for_display(self):
+        """Комментарии вместе с именем автора одним запросом"""
+        return self.select_related('author').only(
+            'text', 'created', 'post', 'author__username'
+        )
+
+
 class Comment(DateModel):
     post = models.ForeignKey(
         Post,
@@ -72,10 +126,23 @@ class Comment(DateModel):
         help_text='Введите текст комментария'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+            # список комментариев в админке
+            models.Index(
+                fields=['created', 'id'],
+                name='comment_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -103,3 +170,131 @@ class Follow(models.Model):
                 name='unique_following'
             )
         ]
+
+
+class Counter(models.Model):
+    """
+    Денормализованный счётчик постов и подписчиков или отметка
+    автора, см. counters.mark_merged
+    """
+    key = models.CharField(max_length=64, unique=True)
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в предвычисленной ленте подписок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # дата поста, продублирована для чтения ленты по индексу
+    created = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'created', 'post'],
+                name='timeline_user_created_idx'
+            )
+        ]
+
+
+class ThumbnailJob(models.Model):
+    """Задание на генерацию миниатюр загруженного изображения"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    image = models.CharField(max_length=255, unique=True)
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Задание на миниатюры'
+        verbose_name_plural = 'Задания на миниатюры'
+        # обработчик выбирает задания по статусу в порядке поступления
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='thumbnail_job_status_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.image}: {self.status}'
+
+
+class MediaFile(models.Model):
+    """Число постов, которые ссылаются на файл изображения"""
+    name = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
+
+
+class SearchTerm(models.Model):
+    """
+    Слово из текста поста в обратном индексе.
+
+    Используется для поиска, когда база не поддерживает FTS5.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Слова поискового индекса'
+        # уникальность заодно даёт индекс для поиска постов по слову
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_search_term'
+            )
+        ]
+
+    def __str__(self):
+        return self.term
@@ -0,0 +1,238 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.expressions import RawSQL
+
+from .models import Post, SearchTerm
+
+FTS5 = 'fts5'
+TERMS = 'terms'
+
+WORD = re.compile(r'\w+')
+# короткие слова есть почти в каждом посте и только замедляют поиск
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+
+def fold(text):
+    """
+    Текст без диакритики: ё -> е.
+
+    remove_diacritics в FTS5 знает только латиницу, поэтому
+    в таблицу FTS5 текст попадает уже обработанным.
+    """
+    return ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(char)
+    )
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, без повторов, в порядке появления"""
+    terms = {}
+    for word in WORD.findall(text.lower()):
+        word = fold(word)[:MAX_TERM_LENGTH]
+        if len(word) >= MIN_TERM_LENGTH:
+            terms.setdefault(word)
+    return list(terms)
+
+
+class FtsIndex:
+    """Индекс в виртуальной таблице FTS5, результаты по релевантности"""
+    name = FTS5
+    table = 'posts_post_fts'
+
+    def _insert(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+            [(post_id, fold(text)) for post_id, text in rows],
+        )
+
+    def update(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id]
+            )
+            self._insert(cursor, [(post_id, text)])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id]
+            )
+
+    def rebuild(self, batch_size=500):
+        rows = 0
+        batch = []
+        posts = Post.objects.values_list('pk', 'text').iterator()
+        # одна транзакция: без неё SQLite фиксирует каждую строку,
+        # а поиск видел бы наполовину пустой индекс
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for row in posts:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._insert(cursor, batch)
+                    batch = []
+                rows += 1
+            self._insert(cursor, batch)
+        return rows
+
+    @staticmethod
+    def _match(terms):
+        # слова в кавычках: синтаксис запросов FTS5 пользователю недоступен
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def filter(self, queryset, terms):
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [self._match(terms)],
+        ))
+
+    def ranked_ids(self, terms, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} '
+                f'MATCH %s ORDER BY rank LIMIT %s',
+                [self._match(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class TermIndex:
+    """
+    Обратный индекс в таблице SearchTerm: слово -> посты.
+
+    Работает на любой базе. Найденные посты содержат все слова
+    запроса и идут от новых к старым.
+    """
+    name = TERMS
+
+    def update(self, post_id, text):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(post_id=post_id, term=term) for term in tokenize(text)
+        )
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    @transaction.atomic
+    def rebuild(self, batch_size=500):
+        SearchTerm.objects.all().delete()
+        rows = 0
+        terms = []
+        posts = Post.objects.values_list('pk', 'text').iterator()
+        for post_id, text in posts:
+            terms.extend(
+                SearchTerm(post_id=post_id, term=term)
+                for term in tokenize(text)
+            )
+            if len(terms) >= batch_size:
+                SearchTerm.objects.bulk_create(terms)
+                terms = []
+            rows += 1
+        SearchTerm.objects.bulk_create(terms)
+        return rows
+
+    @staticmethod
+    def _matches(terms):
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post'
+        ).annotate(found=Count('term')).filter(found=len(terms))
+
+    def filter(self, queryset, terms):
+        return queryset.filter(pk__in=self._matches(terms).values('post'))
+
+    def ranked_ids(self, terms, limit):
+        return list(self._matches(terms).order_by(
+            '-post__created', '-post'
+        ).values_list('post', flat=True)[:limit])
+
+
+# наличие таблицы FTS5 по базам: проверяется один раз на процесс
+_fts_tables = {}
+
+
+def _has_fts_table():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = (
+            FtsIndex.table in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+def get_index():
+    """
+    Индекс, выбранный в POST_SEARCH_BACKEND.
+
+    Без настройки используется FTS5, если миграция смогла создать
+    таблицу, иначе обратный индекс SearchTerm.
+    """
+    name = settings.POST_SEARCH_BACKEND
+    if name is None:
+        name = FTS5 if _has_fts_table() else TERMS
+    return FtsIndex() if name == FTS5 else TermIndex()
+
+
+def index_post(post):
+    get_index().update(post.pk, post.text)
+
+
+def remove_post(post_id):
+    get_index().remove(post_id)
+
+
+def rebuild():
+    """Строит индекс заново по таблице постов, возвращает число постов"""
+    return get_index().rebuild()
+
+
+def filter_posts(queryset, query):
+    """Посты из queryset, содержащие все слова запроса"""
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    return get_index().filter(queryset, terms)
+
+
+class SearchResults:
+    """
+    Найденные посты в порядке выдачи индекса.
+
+    Пагинатор берёт у объекта длину и срезы: id ищутся один раз,
+    а посты загружаются только для показываемой страницы.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = self.ids[index]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search(query, queryset=None):
+    """Не больше POST_SEARCH_MAX_RESULTS постов, содержащих все слова"""
+    if queryset is None:
+        queryset = Post.objects.feed()
+    terms = tokenize(query)
+    ids = []
+    if terms:
+        ids = get_index().ranked_ids(
+            terms, settings.POST_SEARCH_MAX_RESULTS
+        )
+    return SearchResults(ids, queryset)
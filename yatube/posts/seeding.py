@@ -0,0 +1,249 @@
+import random
+import time
+import uuid
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import caching, counters, search, timelines
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+# показатель степени закона Ципфа для популярности авторов, групп
+# и постов
+SKEW = 1.1
+# посты и комментарии распределены по последнему году
+PERIOD = timedelta(days=365)
+
+WORDS = (
+    'кот', 'пёс', 'море', 'город', 'лес', 'книга', 'музыка', 'поезд',
+    'дорога', 'утро', 'вечер', 'зима', 'лето', 'осень', 'весна',
+    'дождь', 'снег', 'солнце', 'река', 'горы', 'друзья', 'работа',
+    'отпуск', 'кофе', 'чай', 'фото', 'прогулка', 'сад', 'дом', 'мост',
+    'новости', 'кино', 'театр', 'спорт', 'бег', 'велосипед', 'рецепт',
+    'ужин', 'завтрак', 'праздник',
+)
+
+
+# шаг генерации: число вставленных строк и время в секундах
+Step = namedtuple('Step', 'name rows seconds')
+
+
+def text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+@contextmanager
+def explicit_dates(*models):
+    """
+    Отключает auto_now_add у поля created на время вставки.
+
+    Иначе bulk_create проставит всем строкам текущее время, и ленты
+    с одинаковой датой у всех постов не похожи на настоящие.
+    """
+    fields = [model._meta.get_field('created') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(objects, size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(model, objects, batch_size, ignore_conflicts=False):
+    """
+    Вставляет строки пачками, каждая пачка в своей транзакции.
+
+    Размер одного INSERT bulk_create выбирает сам по ограничениям СУБД.
+    """
+    total = 0
+    for batch in batches(objects, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts
+            )
+        total += len(batch)
+    return total
+
+
+def new_ids(model, after):
+    # bulk_create на SQLite не возвращает первичные ключи
+    return list(model.objects.filter(pk__gt=after).order_by(
+        'pk'
+    ).values_list('pk', flat=True))
+
+
+def _last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def power_law(count, exponent):
+    """
+    Накопленные веса закона Ципфа для rng.choices: k-й по
+    популярности элемент выбирают в k ** exponent раз реже первого
+    """
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def ranked(rng, ids):
+    # популярность не должна совпадать с порядком первичных ключей
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids
+
+
+def follow_pairs(rng, user_ids, authors, weights, follows):
+    """
+    Подписки: каждый читатель выбирает авторов по популярности,
+    поэтому число подписчиков распределено по степенному закону
+    """
+    limit = len(user_ids) - 1
+    per_user = Counter(rng.choices(range(len(user_ids)), k=follows))
+    for index, count in per_user.items():
+        user_id = user_ids[index]
+        count = min(count, limit)
+        chosen = set()
+        # у популярных авторов повторы часты: число попыток ограничено
+        for _ in range(count * 10):
+            author_id = rng.choices(authors, cum_weights=weights)[0]
+            if author_id != user_id:
+                chosen.add(author_id)
+                if len(chosen) == count:
+                    break
+        for author_id in chosen:
+            yield Follow(user_id=user_id, author_id=author_id)
+
+
+def seed(posts, users=None, groups=None, comments=None, follows=None,
+         batch_size=BATCH_SIZE, exponent=SKEW, random_seed=None):
+    """
+    Создаёт синтетических пользователей, группы, посты, комментарии
+    и подписки. Возвращает шаги (Step) с числом строк и временем.
+
+    Авторы, группы и посты выбираются по закону Ципфа: немного
+    популярных авторов с большинством подписчиков и постов, горячие
+    группы и обсуждаемые посты. Строки вставляются через bulk_create
+    в обход сигналов, поэтому в конце пересчитываются счётчики,
+    поисковый индекс и ленты подписок.
+    """
+    rng = random.Random(random_seed)
+    users = users if users is not None else max(posts // 20, 10)
+    groups = groups if groups is not None else max(posts // 1000, 5)
+    comments = comments if comments is not None else posts
+    follows = follows if follows is not None else users * 10
+    prefix = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    steps = []
+
+    def step(name, model, objects, **kwargs):
+        started = time.perf_counter()
+        rows = insert(model, objects, batch_size, **kwargs)
+        steps.append(Step(name, rows, time.perf_counter() - started))
+
+    last_user = _last_pk(User)
+    step('users', User, (
+        User(username=f'seed_{prefix}_{number}', password='!')
+        for number in range(users)
+    ))
+    user_ids = new_ids(User, last_user)
+    authors = ranked(rng, user_ids)
+    author_weights = power_law(len(authors), exponent)
+
+    last_group = _last_pk(Group)
+    step('groups', Group, (
+        Group(
+            title=f'Группа {number}',
+            slug=f'seed-{prefix}-{number}',
+            description=text(rng, 5, 20),
+        )
+        for number in range(groups)
+    ))
+    hot_groups = ranked(rng, new_ids(Group, last_group))
+    group_weights = power_law(len(hot_groups), exponent)
+
+    # число комментариев каждого поста известно заранее: не нужен
+    # пересчёт comments_count после вставки
+    per_post = [0] * posts
+    if posts:
+        discussed = ranked(rng, range(posts))
+        # обсуждаемость постов распределена мягче, чем популярность
+        # авторов: иначе один пост собрал бы заметную долю комментариев
+        for index in rng.choices(
+            discussed, cum_weights=power_law(posts, exponent / 2),
+            k=comments,
+        ):
+            per_post[index] += 1
+    dates = sorted(now - PERIOD * rng.random() for _ in range(posts))
+
+    # авторы и группы выбираются сразу для всех постов: так быстрее
+    post_authors = rng.choices(authors, cum_weights=author_weights, k=posts)
+    post_groups = rng.choices(
+        hot_groups, cum_weights=group_weights, k=posts
+    ) if hot_groups else [None] * posts
+
+    last_post = _last_pk(Post)
+    with explicit_dates(Post, Comment):
+        step('posts', Post, (
+            Post(
+                text=text(rng, 5, 60),
+                author_id=post_authors[number],
+                group_id=post_groups[number] if rng.random() < 0.7
+                else None,
+                created=created,
+                comments_count=per_post[number],
+            )
+            for number, created in enumerate(dates)
+        ))
+        post_ids = new_ids(Post, last_post)
+        step('comments', Comment, (
+            Comment(
+                post_id=post_id,
+                author_id=rng.choice(user_ids),
+                text=text(rng, 3, 20),
+                created=created + (now - created) * rng.random(),
+            )
+            for post_id, created, count in zip(post_ids, dates, per_post)
+            for _ in range(count)
+        ))
+
+    step('follows', Follow, follow_pairs(
+        rng, user_ids, authors, author_weights, follows
+    ) if len(user_ids) > 1 else (), ignore_conflicts=True)
+
+    started = time.perf_counter()
+    rebuild_derived()
+    steps.append(Step('rebuild', None, time.perf_counter() - started))
+    return steps
+
+
+def rebuild_derived():
+    """Пересчитывает данные, которые обычно поддерживают сигналы"""
+    counters.rebuild()
+    search.rebuild()
+    if timelines.fan_out_enabled():
+        timelines.rebuild()
+    # новые посты попадают на главную; ленты новых авторов и групп
+    # ещё не кэшировались
+    caching.bump(caching.INDEX, caching.GROUPS, caching.USERS)
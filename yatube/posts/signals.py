@@ -0,0 +1,151 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, media, search, thumbnails, timelines
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_refs(sender, instance, **kwargs):
+    """
+    Запоминает автора, группу, изображение и текст поста
+    до редактирования
+    """
+    instance._old_refs = None
+    instance._old_image = None
+    instance._old_text = None
+    if instance.pk is not None:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'author_id', 'group_id', 'image', 'text'
+        ).first()
+        if old:
+            instance._old_refs = old[:2]
+            instance._old_image, instance._old_text = old[2:]
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_refs = getattr(instance, '_old_refs', None)
+    old = counters.post_keys(*old_refs) if old_refs else []
+    new = counters.post_keys(instance.author_id, instance.group_id)
+    counters.change([key for key in old if key not in new], -1)
+    counters.change([key for key in new if key not in old], 1)
+
+    scopes = set(caching.post_scopes(instance.author_id, instance.group_id))
+    scopes.add(caching.card_scope(instance.pk))
+    if old_refs:
+        scopes.update(caching.post_scopes(*old_refs))
+    caching.bump(*scopes)
+
+    if timelines.fan_out_enabled():
+        if created:
+            timelines.fan_out(instance)
+        else:
+            timelines.posts_changed(instance.author_id)
+            if old_refs and old_refs[0] != instance.author_id:
+                timelines.posts_changed(old_refs[0])
+
+    if instance.text != getattr(instance, '_old_text', None):
+        search.index_post(instance)
+
+    image = instance.image.name
+    old_image = getattr(instance, '_old_image', None)
+    if image != old_image:
+        if old_image:
+            media.release(old_image)
+        # у дубликата уже загруженного файла миниатюры есть
+        if image and media.acquire(image):
+            thumbnails.enqueue(image)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(
+        counters.post_keys(instance.author_id, instance.group_id), -1
+    )
+    caching.bump(*caching.post_scopes(instance.author_id, instance.group_id))
+    if timelines.fan_out_enabled():
+        timelines.posts_changed(instance.author_id)
+    search.remove_post(instance.pk)
+    if instance.image:
+        media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump(
+        caching.GROUPS,
+        caching.group_scope(instance.pk),
+        caching.group_info_scope(instance.pk),
+    )
+
+
+# поля пользователя, которые выводятся в карточке поста
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # вход на сайт сохраняет только last_login: карточки не меняются
+    if created or update_fields and not CARD_USER_FIELDS & set(
+        update_fields
+    ):
+        return
+    caching.bump(caching.USERS, caching.user_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    counters.followers_changed(instance.author_id, 1)
+    if timelines.fan_out_enabled():
+        timelines.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.followers_changed(instance.author_id, -1)
+    if timelines.fan_out_enabled():
+        timelines.prune(instance.user_id, instance.author_id)
+
+
+def comments_changed(post_id, delta):
+    counters.comments_changed(post_id, delta)
+    refs = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if refs:
+        # число комментариев выводится в карточке поста
+        caching.bump(caching.card_scope(post_id), *caching.post_scopes(*refs))
+        if timelines.fan_out_enabled():
+            timelines.posts_changed(refs[0])
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_post(sender, instance, **kwargs):
+    instance._old_post_id = None
+    if instance.pk is not None:
+        instance._old_post_id = Comment.objects.filter(
+            pk=instance.pk
+        ).values_list('post_id', flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    old_post_id = getattr(instance, '_old_post_id', None)
+    if not created and old_post_id == instance.post_id:
+        # текст комментария выводится на странице поста
+        caching.bump(caching.card_scope(instance.post_id))
+        return
+    if old_post_id is not None:
+        comments_changed(old_post_id, -1)
+    if instance.post_id is not None:
+        comments_changed(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        comments_changed(instance.post_id, -1)
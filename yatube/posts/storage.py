@@ -0,0 +1,45 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — хэш его содержимого.
+
+    Каталог из upload_to сохраняется, имя файла заменяется на SHA-256
+    содержимого: posts/small.gif -> posts/ab/ab12...ef.gif. Одинаковые
+    загрузки получают одно имя, и файл на диск пишется один раз.
+    """
+
+    def digest(self, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def hashed_name(self, name, digest):
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # итоговое имя выбирается в _save по содержимому
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, self.digest(content))
+        if self.exists(name):
+            return name
+        # одно и то же содержимое могут сохранять одновременно:
+        # пишем во временный файл рядом и атомарно переименовываем
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+image_storage = ContentAddressedStorage()
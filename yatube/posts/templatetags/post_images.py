@@ -0,0 +1,21 @@
+from django import template
+
+from core import metrics
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(image, layout='feed'):
+    """
+    Варианты изображения поста для <picture>, если они уже созданы.
+
+    Пока фоновый обработчик их не создал, выводится исходное
+    изображение: страница не ждёт генерации.
+    """
+    if not image:
+        return None
+    picture = thumbnails.picture(image, layout)
+    metrics.incr('thumbnails.hit' if picture.srcset else 'thumbnails.miss')
+    return picture
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class LargeTableAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        for number in range(5):
+            post = Post.objects.create(
+                author=cls.admin, text=f'Пост {number}', group=cls.group
+            )
+            Comment.objects.create(
+                author=cls.admin, post=post, text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        counters.rebuild()
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_query_count_does_not_depend_on_rows(self):
+        """Авторы, группы и посты загружаются вместе со строками."""
+        for model in ('post', 'comment'):
+            with self.subTest(model=model):
+                _, queries = self.changelist_queries(model)
+                Post.objects.create(
+                    author=User.objects.create_user(username=model),
+                    text='Ещё пост',
+                    group=Group.objects.create(slug=model),
+                )
+                _, more_queries = self.changelist_queries(model)
+                self.assertEqual(len(more_queries), len(queries))
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=1)
+    def test_large_table_is_not_counted(self):
+        """Без фильтров число строк берётся из оценки, без COUNT(*)."""
+        for model, table in (('post', 'posts_post'),
+                             ('comment', 'posts_comment')):
+            with self.subTest(model=model):
+                response, queries = self.changelist_queries(model)
+                self.assertEqual(response.context['cl'].result_count, 5)
+                self.assertFalse([
+                    sql for sql in queries
+                    if 'COUNT(' in sql and f'FROM "{table}"' in sql
+                ])
+
+    def test_foreign_keys_use_autocomplete(self):
+        """Вместо списков всех групп выводятся поля с подсказками."""
+        Group.objects.create(title='Другая группа', slug='other')
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=[post.pk])
+        )
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'Другая группа')
+        response, _ = self.changelist_queries('post')
+        self.assertIsNotNone(response.context['cl'].date_hierarchy)
@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase
+
+from posts import urls
+from posts.management.commands.benchmark_views import dataset
+from posts.models import Comment, Follow, Post
+
+
+class BenchmarkViewsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.output = os.path.join(self.directory, 'result.json')
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark_views', requests=2, warmup=0, output=self.output,
+            stderr=StringIO(), **options
+        )
+        with open(self.output, encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_seeds_and_measures_every_url(self):
+        """Замер покрывает все адреса posts/urls.py."""
+        result = self.benchmark(
+            seed_posts=30, seed_users=5, seed_follows=10, cold=True
+        )
+        self.assertEqual(result['dataset']['posts'], 30)
+        self.assertEqual(
+            set(result['results']),
+            {pattern.name for pattern in urls.urlpatterns},
+        )
+        for name, measured in result['results'].items():
+            with self.subTest(url=name):
+                self.assertLess(measured['status'], 400)
+                self.assertLessEqual(measured['p50_ms'], measured['p99_ms'])
+        self.assertGreater(result['results']['index']['queries'], 0)
+        # даты постов разные, а число комментариев сходится с таблицей
+        self.assertGreater(
+            Post.objects.values('created').distinct().count(), 1
+        )
+        post = Post.objects.order_by('-comments_count').first()
+        self.assertEqual(
+            post.comments_count,
+            Comment.objects.filter(post=post).count(),
+        )
+
+    def test_write_cases_do_not_change_data(self):
+        """Пишущие сценарии откатываются, подписка каждый раз настоящая."""
+        self.benchmark(seed_posts=20, seed_users=5, only=['index'])
+        before = dataset()
+        events = []
+
+        def record(sender, **kwargs):
+            events.append(kwargs.get('created', False))
+
+        post_save.connect(record, sender=Follow)
+        post_delete.connect(record, sender=Follow)
+        self.addCleanup(post_save.disconnect, record, sender=Follow)
+        self.addCleanup(post_delete.disconnect, record, sender=Follow)
+        result = self.benchmark(
+            only=['add_comment', 'profile_follow', 'profile_unfollow']
+        )
+        self.assertEqual(dataset(), before)
+        self.assertEqual(result['dataset'], before)
+        # по два замеренных запроса подписки и отписки, не считая
+        # подготовительных
+        self.assertGreaterEqual(events.count(True), 3)
+        self.assertGreaterEqual(events.count(False), 3)
+
+    def test_regression_against_baseline(self):
+        """Рост числа запросов относительно прошлого прогона — ошибка."""
+        baseline = self.benchmark(seed_posts=20, cold=True, only=['index'])
+        baseline['results']['index']['queries'] -= 1
+        baseline_path = os.path.join(self.directory, 'baseline.json')
+        with open(baseline_path, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, 'index: запросов'):
+            self.benchmark(cold=True, only=['index'], compare=baseline_path)
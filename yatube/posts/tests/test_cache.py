@@ -1,6 +1,12 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
-from posts.models import Post, Group
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from posts import caching
+from posts.models import Comment, Follow, Post, Group
+from posts.views import POSTS_AMOUNT, GroupPostsView
 from django.core.cache import cache
 from django.urls import reverse
 
@@ -35,10 +41,427 @@ class IndexPageCacheTest(TestCase):
         """Проверка кэша главной страницы"""
         cache.clear()
         f_response = self.authorized_client.get(reverse('posts:index'))
-        f_post = Post.objects.get(id=1)
-        f_post.delete()
+        # изменение в обход сигналов не сбрасывает кэш
+        Post.objects.filter(id=self.post.id).update(text='Изменённый текст')
         s_response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(f_response.content, s_response.content)
         cache.clear()
         t_response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(f_response.content, t_response.content)
+
+    def test_feed_cache_invalidated_on_post_change(self):
+        """Удаление и создание поста сразу видны во всех лентах"""
+        cache.clear()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост'
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.guest_client.get(url), 'Свежий пост'
+                )
+
+    def test_feed_cache_invalidated_on_group_change(self):
+        """Изменение группы сбрасывает кэш лент со ссылками на неё"""
+        cache.clear()
+        self.guest_client.get(reverse('posts:index'))
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new_slug'
+        group.save()
+        self.assertContains(
+            self.guest_client.get(reverse('posts:index')),
+            reverse('posts:group_list', kwargs={'slug': 'new_slug'})
+        )
+
+    def test_feed_cache_varies_on_page(self):
+        """Каждая страница ленты кэшируется отдельно"""
+        cache.clear()
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост номер {x}')
+            for x in range(POSTS_AMOUNT)
+        )
+        caching.bump(caching.INDEX)
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, 'Тестовый текст')
+
+    def test_feed_cache_varies_on_scope(self):
+        """Совпавшие поколения двух авторов не смешивают их ленты"""
+        cache.clear()
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Пост другого автора')
+        for user in (self.user, other):
+            cache.set(
+                f'generation:{caching.author_scope(user.pk)}', 1, None
+            )
+        self.authorized_client.get(
+            reverse('posts:profile', args=[self.user.username])
+        )
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[other.username])
+        )
+        self.assertContains(response, 'Пост другого автора')
+        self.assertNotContains(response, 'Тестовый текст')
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый текст',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_card_reused_when_page_is_rebuilt(self):
+        """Новый пост перестраивает страницу, но не чужие карточки."""
+        self.client.get(reverse('posts:index'))
+        # изменение в обход сигналов: карточка должна остаться из кэша
+        Post.objects.filter(pk=self.post.pk).update(text='Изменённый текст')
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+        self.assertContains(response, 'Тестовый текст')
+
+    def test_card_shared_between_feeds(self):
+        """Карточка, отрисованная в одной ленте, берётся из кэша в другой."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Изменённый текст')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, 'Тестовый текст')
+
+    def test_card_invalidated_on_changes(self):
+        """Карточку сбрасывают правка поста, имени автора и группы."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый текст'
+        post.save()
+        self.assertContains(self.client.get(url), 'Изменённый текст')
+
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Алексей'
+        user.save()
+        self.assertContains(self.client.get(url), 'Алексей Толстой')
+
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new_slug'
+        group.save()
+        self.assertContains(
+            self.client.get(url),
+            reverse('posts:group_list', kwargs={'slug': 'new_slug'})
+        )
+
+    def test_cached_feed_does_not_query_posts(self):
+        """При попадании в кэш ленты посты страницы не выбираются."""
+        self.client.force_login(self.user)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ):
+            with self.subTest(url=url):
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, 'Тестовый текст')
+                self.assertFalse([
+                    query['sql'] for query in queries
+                    if 'FROM "posts_post"' in query['sql']
+                ])
+
+    def test_login_does_not_invalidate_cards(self):
+        """Вход автора на сайт не сбрасывает его карточки."""
+        versions = caching.card_versions([self.post])
+        self.client.force_login(self.user)
+        self.assertEqual(caching.card_versions([self.post]), versions)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_group',
+            description='Другое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый текст'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.user, group=cls.other_group, text='Другой текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'other_group': reverse(
+                'posts:group_list', args=[self.other_group.slug]
+            ),
+            'detail': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+        for url in self.urls.values():
+            self.guest_client.get(url)
+
+    def assertCached(self, name):
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.urls[name])
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        """Повторный запрос гостя отдаётся без представления и запросов."""
+        for name in self.urls:
+            with self.subTest(page=name):
+                self.assertIsNone(self.assertCached(name).context)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(self.urls['index'])
+        self.assertIsNotNone(response.context)
+
+    def test_post_change_purges_only_its_pages(self):
+        """Правка поста сбрасывает только страницы, где он выведен."""
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for name in ('index', 'group', 'detail'):
+            with self.subTest(page=name):
+                response = self.guest_client.get(self.urls[name])
+                self.assertContains(response, 'Новый текст')
+        self.assertCached('other_group')
+
+    def test_change_during_render_is_not_cached(self):
+        """Правка во время построения страницы не остаётся в её кэше."""
+        cache.clear()
+        get_context_data = GroupPostsView.get_context_data
+
+        def change_posts(view, **kwargs):
+            context = get_context_data(view, **kwargs)
+            # посты страницы уже выбраны, шаблон покажет старый текст
+            list(context['page_obj'])
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Новый текст'
+            post.save()
+            group = Group.objects.get(pk=self.group.pk)
+            group.title = 'Новое название'
+            group.save()
+            return context
+
+        with mock.patch.object(
+            GroupPostsView, 'get_context_data', change_posts
+        ):
+            response = self.guest_client.get(self.urls['group'])
+        self.assertContains(response, 'Тестовый текст')
+        response = self.guest_client.get(self.urls['group'])
+        self.assertContains(response, 'Новый текст')
+        self.assertContains(response, 'Новое название')
+
+    def test_comment_and_group_changes_purge_pages(self):
+        """Комментарий сбрасывает страницу поста, правка группы — её ленту."""
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        self.assertContains(
+            self.guest_client.get(self.urls['detail']), 'Свежий комментарий'
+        )
+        self.other_group.title = 'Переименованная группа'
+        self.other_group.save()
+        self.assertContains(
+            self.guest_client.get(self.urls['other_group']),
+            'Переименованная группа',
+        )
+
+    def test_unrelated_changes_keep_pages(self):
+        """Другой пользователь и новая группа не сбрасывают страниц."""
+        reader = User.objects.create_user(username='reader')
+        reader.set_password('новый-пароль')
+        reader.save()
+        Group.objects.create(title='Новая группа', slug='new_group')
+        for name in self.urls:
+            with self.subTest(page=name):
+                self.assertCached(name)
+
+    def test_comment_author_rename_purges_post_page(self):
+        """Новое имя автора комментария сбрасывает страницу поста."""
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='Комментарий'
+        )
+        # комментарий меняет карточку поста и на главной
+        for name in ('index', 'detail'):
+            self.guest_client.get(self.urls[name])
+        self.assertCached('detail')
+        commenter.username = 'renamed'
+        commenter.save()
+        self.assertContains(
+            self.guest_client.get(self.urls['detail']), 'renamed'
+        )
+        self.assertCached('index')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый текст'
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'profile': reverse('posts:profile', args=[self.author.username]),
+            'detail': reverse('posts:post_detail', args=[self.post.pk]),
+            'follow': reverse('posts:follow_index'),
+        }
+
+    def revalidate(self, url, client=None):
+        client = client or self.authorized_client
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered(self):
+        """Неизменившаяся страница отдаётся как 304 без шаблона."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response.content, b'')
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_changes_update_etag(self):
+        """Пост, комментарий и подписка меняют ETag своих страниц."""
+        etags = {
+            name: self.authorized_client.get(url)['ETag']
+            for name, url in self.urls.items()
+        }
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        comment.text = 'Исправленный комментарий'
+        comment.save()
+        response = self.authorized_client.get(
+            self.urls['detail'], HTTP_IF_NONE_MATCH=etags['detail']
+        )
+        self.assertContains(response, 'Исправленный комментарий')
+        Post.objects.create(author=self.author, text='Новый пост')
+        Follow.objects.filter(user=self.user).delete()
+        for name in ('index', 'profile', 'follow'):
+            with self.subTest(page=name):
+                response = self.authorized_client.get(
+                    self.urls[name], HTTP_IF_NONE_MATCH=etags[name]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(FOLLOW_TIMELINE='write')
+    def test_follow_etag_uses_timeline_scope(self):
+        """С раскладкой ETag ленты подписок не читает список подписок."""
+        url = self.urls['follow']
+        etag = self.authorized_client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if 'posts_follow' in query['sql']
+        ])
+        post = Post.objects.get(pk=self.post.pk)
+
+        def new_post():
+            Post.objects.create(author=self.author, text='Новый пост')
+
+        def edit_post():
+            post.text = 'Исправленный текст'
+            post.save()
+
+        def comment():
+            Comment.objects.create(
+                post=post, author=self.user, text='Комментарий'
+            )
+
+        def unfollow():
+            Follow.objects.filter(user=self.user).delete()
+
+        for change in (new_post, edit_post, comment, unfollow):
+            with self.subTest(change=change.__name__):
+                change()
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+
+    def test_etag_varies_on_user_and_page(self):
+        """В заголовке страницы имя пользователя, в адресе — номер."""
+        url = self.urls['index']
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertNotEqual(Client().get(url)['ETag'], etag)
+        self.assertNotEqual(
+            self.authorized_client.get(url, {'page': 1})['ETag'], etag
+        )
+
+    def test_last_modified_for_guests(self):
+        """Гость получает Last-Modified, в том числе из кэша страниц."""
+        guest_client = Client()
+        url = self.urls['group']
+        response = guest_client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        for _ in range(2):
+            self.assertEqual(guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code, 304)
+        self.assertEqual(self.revalidate(url, guest_client).status_code, 304)
+        self.assertFalse(
+            self.authorized_client.get(url).has_header('Last-Modified')
+        )
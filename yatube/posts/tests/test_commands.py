@@ -0,0 +1,29 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+
+class ExplainFeedsCommandTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают данные по индексам, без сортировки."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        self.assertNotIn('full scan', out.getvalue())
+        self.assertIn('index: OK', out.getvalue())
+
+    def test_cursor_queries_read_key_range(self):
+        """Переход по курсору читает диапазон индекса по дате."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        for feed in ('index', 'group', 'profile', 'comments'):
+            for cursor in ('cursor', 'previous cursor'):
+                self.assertIn(f'{feed}, {cursor}: OK', out.getvalue())
+
+
+class ShowMetricsCommandTest(TestCase):
+    def test_fails_without_shared_cache(self):
+        """С кэшем в памяти процесса команда сообщает, что метрик не видно."""
+        with self.assertRaisesMessage(CommandError, 'CACHE_URL'):
+            call_command('show_metrics', stdout=StringIO())
@@ -1,6 +1,12 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import Client, TestCase
-from posts.models import Post, Group
+from posts import caching, counters
+from posts.models import Post, Group, Comment
+from posts.views import COMMENTS_AMOUNT
 from django.urls import reverse
 from django import forms
 
@@ -45,3 +51,143 @@ class CommentTests(TestCase):
             with self.subTest(value=value):
                 form_field = response.context['form'].fields[value]
                 self.assertIsInstance(form_field, expected)
+
+
+class CommentsPaginationTests(TestCase):
+    ALL_COMMENTS = COMMENTS_AMOUNT + 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый текст')
+        for x in range(cls.ALL_COMMENTS):
+            commentator = User.objects.create_user(username=f'reader{x}')
+            Comment.objects.create(
+                post=cls.post, author=commentator, text=f'Комментарий {x}'
+            )
+        counters.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_post_detail_renders_first_comments_page(self):
+        """На странице поста выводится только первая страница"""
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_AMOUNT)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, f'Комментарий {self.ALL_COMMENTS - 1}')
+        self.assertNotContains(response, 'Комментарий 0<')
+        self.assertContains(response, 'Показать ещё комментарии')
+
+    def test_comments_fragment_returns_next_page(self):
+        """Следующая страница отдаётся HTML-фрагментом и в JSON"""
+        first = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )).context['comments']
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(
+            url, {'cursor': str(first.next_cursor)}
+        )
+        self.assertContains(response, 'Комментарий 0')
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'Показать ещё комментарии')
+
+        data = self.guest_client.get(
+            url, {'cursor': str(first.next_cursor), 'format': 'json'}
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            [f'Комментарий {x}' for x in range(4, -1, -1)]
+        )
+        self.assertEqual(data['next_cursor'], '')
+
+
+class CommentsCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.other_post = Post.objects.create(
+            author=cls.user, text='Другой пост'
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assertCommentsCount(self, post, count):
+        post.refresh_from_db(fields=['comments_count'])
+        self.assertEqual(post.comments_count, count)
+
+    def test_count_follows_comments(self):
+        """Число комментариев меняется при добавлении, переносе и удалении."""
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        self.assertCommentsCount(self.post, 1)
+        comment = Comment.objects.get(post=self.post)
+        comment.post = self.other_post
+        comment.save()
+        self.assertCommentsCount(self.post, 0)
+        self.assertCommentsCount(self.other_post, 1)
+        comment.delete()
+        self.assertCommentsCount(self.other_post, 0)
+
+    def test_count_is_shown_on_feed_card(self):
+        """Карточка в ленте показывает актуальное число комментариев."""
+        Comment.objects.create(post=self.post, author=self.user, text='1')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+        Comment.objects.create(post=self.post, author=self.user, text='2')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 2')
+
+    def test_repair_command(self):
+        """repair_comment_counts исправляет разошедшиеся счётчики."""
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.user, text=str(number))
+            for number in range(3)
+        ])
+        Post.objects.filter(pk=self.other_post.pk).update(comments_count=5)
+        out = StringIO()
+        call_command('repair_comment_counts', stdout=out)
+        self.assertIn('Исправлено постов: 2', out.getvalue())
+        self.assertCommentsCount(self.post, 3)
+        self.assertCommentsCount(self.other_post, 0)
+
+    def test_repair_command_bumps_only_repaired_feeds(self):
+        """repair_comment_counts сбрасывает ленты исправленных постов."""
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(author=self.user, group=group, text='Пост')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.user, text='1')
+        ])
+        scopes = {
+            'card': caching.card_scope(post.pk),
+            'index': caching.INDEX,
+            'group': caching.group_scope(group.pk),
+            'profile': caching.author_scope(self.user.pk),
+        }
+        untouched = {
+            'users': caching.USERS,
+            'other_card': caching.card_scope(self.other_post.pk),
+        }
+        before = {
+            name: caching.generation(scope)
+            for name, scope in {**scopes, **untouched}.items()
+        }
+        call_command('repair_comment_counts', stdout=StringIO())
+        for name, scope in scopes.items():
+            with self.subTest(scope=name):
+                self.assertNotEqual(caching.generation(scope), before[name])
+        for name, scope in untouched.items():
+            with self.subTest(scope=name):
+                self.assertEqual(caching.generation(scope), before[name])
@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from posts import caching, counters
+from posts.models import Counter, Post, Group
+
+
+User = get_user_model()
+
+
+class PostCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.second_group = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_group_2',
+            description='Тестовое описание 2',
+        )
+        Post.objects.create(author=cls.user, text='Пост', group=cls.group)
+
+    def assertCounts(self, total, author, group, second_group):
+        self.assertEqual(counters.all_posts_count(), total)
+        self.assertEqual(counters.author_posts_count(self.user.pk), author)
+        self.assertEqual(counters.group_posts_count(self.group.pk), group)
+        self.assertEqual(
+            counters.group_posts_count(self.second_group.pk), second_group
+        )
+
+    def test_counters_follow_post_changes(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        self.assertCounts(1, 1, 1, 0)
+        post = Post.objects.create(
+            author=self.user, text='Новый пост', group=self.group
+        )
+        self.assertCounts(2, 2, 2, 0)
+        post.group = self.second_group
+        post.save()
+        self.assertCounts(2, 2, 1, 1)
+        post.delete()
+        self.assertCounts(1, 1, 1, 0)
+
+    def test_counters_are_read_without_count_query(self):
+        """Заполненный счётчик читается одним запросом без COUNT(*)."""
+        counters.rebuild()
+        with self.assertNumQueries(1) as context:
+            counters.all_posts_count()
+        self.assertNotIn('COUNT', context.captured_queries[0]['sql'])
+
+    def test_rebuild_repairs_stale_counters(self):
+        """Пересчёт исправляет счётчики после bulk_create."""
+        counters.rebuild()
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {x}') for x in range(3)
+        )
+        self.assertEqual(counters.all_posts_count(), 1)
+        counters.rebuild()
+        self.assertCounts(4, 4, 1, 0)
+
+    def test_change_during_count_is_kept(self):
+        """Пост, созданный во время подсчёта, попадает в счётчик."""
+        Counter.objects.all().delete()
+
+        def compute(keys):
+            counts = {counters.ALL_POSTS: Post.objects.count()}
+            Post.objects.create(author=self.user, text='Пост при подсчёте')
+            return counts
+
+        self.assertEqual(
+            counters.get_counts([counters.ALL_POSTS], compute),
+            {counters.ALL_POSTS: 1},
+        )
+        self.assertEqual(counters.all_posts_count(), 2)
+
+    def test_rebuild_command_bumps_counted_pages(self):
+        """Команда пересчёта сбрасывает страницы со счётчиками."""
+        counters.rebuild()
+        other = User.objects.create_user(username='other')
+        # счётчик автора без постов пересчёт удалит
+        Counter.objects.create(key=counters.author_key(other.pk), value=3)
+        scopes = [
+            caching.INDEX,
+            caching.author_scope(self.user.pk),
+            caching.author_scope(other.pk),
+            caching.group_scope(self.group.pk),
+        ]
+        before = [caching.generation(scope) for scope in scopes]
+        call_command('rebuild_counters', stdout=StringIO())
+        for scope, version in zip(scopes, before):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(caching.generation(scope), version)
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+
+class SqlitePragmasTest(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def open_connection(self):
+        """Новое соединение с файлом SQLite, как у процесса сервера"""
+        default = connections['default']
+        wrapper = default.__class__(
+            {
+                **default.settings_dict,
+                'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            },
+            alias='pragmas',
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'wal', 'synchronous': 'normal'
+    })
+    def test_production_pragmas_are_applied(self):
+        """Новое соединение переводится в WAL с synchronous=NORMAL."""
+        wrapper = self.open_connection()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_development_keeps_defaults(self):
+        """Без профиля production соединение не настраивается."""
+        wrapper = self.open_connection()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+
+
+class LoadTestCommandTest(TransactionTestCase):
+    def test_worker_reports_throughput(self):
+        """Прогон в текущем профиле выводит число запросов и задержки."""
+        out = StringIO()
+        call_command(
+            'load_test', worker=True, duration=0.2, threads=1, stdout=out
+        )
+        result = json.loads(out.getvalue())
+        self.assertGreater(result['requests'], 0)
+        self.assertEqual(result['errors'], 0)
+        self.assertIn('p95_ms', result)
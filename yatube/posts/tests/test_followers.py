@@ -1,6 +1,13 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
-from posts.models import Post, Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from core import metrics
+from posts import counters, timelines
+from posts.models import Counter, Post, Group, Follow, TimelineEntry
+from posts.views import POSTS_AMOUNT
 from django.urls import reverse
 
 User = get_user_model()
@@ -82,3 +89,146 @@ class IndexPageCacheTest(TestCase):
 
         # отписались, теперь 0 постов
         self.assertEqual(len(follower_response.context['page_obj']), 0)
+
+
+@override_settings(FOLLOW_TIMELINE='write', FOLLOW_TIMELINE_LENGTH=3)
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='follower')
+        cls.following = User.objects.create_user(username='following')
+        cls.another = User.objects.create_user(username='anotherUser')
+
+    def setUp(self):
+        self.authorized_follower = Client()
+        self.authorized_follower.force_login(self.follower)
+
+    def follow_page_texts(self):
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка переносит посты автора в ленту, отписка убирает их"""
+        for x in range(5):
+            Post.objects.create(author=self.following, text=f'Старый {x}')
+        self.authorized_follower.post(
+            reverse('posts:profile_follow', kwargs={
+                'username': 'following'}))
+        # в ленту попадают только последние FOLLOW_TIMELINE_LENGTH постов
+        self.assertEqual(
+            self.follow_page_texts(), ['Старый 4', 'Старый 3', 'Старый 2']
+        )
+        self.authorized_follower.post(
+            reverse('posts:profile_unfollow', kwargs={
+                'username': 'following'}))
+        self.assertEqual(self.follow_page_texts(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост сразу записывается в ленты подписчиков"""
+        Follow.objects.create(user=self.follower, author=self.following)
+        Post.objects.create(author=self.following, text='Новый пост')
+        Post.objects.create(author=self.another, text='Чужой пост')
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post__text')),
+            [(self.follower.pk, 'Новый пост')]
+        )
+        self.assertEqual(self.follow_page_texts(), ['Новый пост'])
+
+    def test_fan_out_keeps_timeline_length(self):
+        """После раскладки в ленте не больше FOLLOW_TIMELINE_LENGTH постов"""
+        Follow.objects.create(user=self.follower, author=self.following)
+        Follow.objects.create(user=self.another, author=self.following)
+        for x in range(10):
+            Post.objects.create(author=self.following, text=f'Пост {x}')
+        for user in (self.follower, self.another):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    list(TimelineEntry.objects.filter(user=user).values_list(
+                        'post__text', flat=True
+                    )),
+                    ['Пост 9', 'Пост 8', 'Пост 7'],
+                )
+
+
+@override_settings(FOLLOW_TIMELINE='hybrid', FOLLOW_TIMELINE_FANOUT_LIMIT=1)
+class HybridTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='follower')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+        cls.fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=cls.follower, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_follower = Client()
+        self.authorized_follower.force_login(self.follower)
+
+    def test_high_follower_posts_are_merged_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        for x in range(POSTS_AMOUNT):
+            Post.objects.create(author=self.star, text=f'Звезда {x}')
+            Post.objects.create(author=self.author, text=f'Автор {x}')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists()
+        )
+        expected = list(Post.objects.order_by('-created', '-pk'))
+
+        response = self.authorized_follower.get(
+            reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, len(expected))
+        seen = list(page)
+        while page.has_next():
+            page = self.authorized_follower.get(
+                reverse('posts:follow_index'),
+                {'cursor': str(page.next_cursor)}
+            ).context['page_obj']
+            seen.extend(page)
+        self.assertEqual(seen, expected)
+
+        stats = metrics.snapshot()
+        self.assertEqual(stats['timeline.fanout_limit'], 1)
+        self.assertEqual(stats['timeline.fanout.skipped'], POSTS_AMOUNT)
+        self.assertEqual(stats['timeline.merge.sources'], 4)
+        self.assertIn('timeline.merge.ms', stats)
+
+    def follow_page_texts(self):
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_author_below_limit_keeps_skipped_posts(self):
+        """Посты, пропущенные при раскладке, не пропадают из ленты"""
+        Post.objects.create(author=self.star, text='Пропущенный пост')
+        # у звезды остаётся один подписчик — теперь не больше лимита
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertEqual(self.follow_page_texts(), ['Пропущенный пост'])
+        Post.objects.create(author=self.star, text='Новый пост')
+        self.assertEqual(
+            self.follow_page_texts(), ['Новый пост', 'Пропущенный пост']
+        )
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(timelines.high_follower_authors(), [])
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.follower, post__author=self.star
+        ).count(), 2)
+        self.assertEqual(
+            self.follow_page_texts(), ['Новый пост', 'Пропущенный пост']
+        )
+
+    def test_missing_follower_counter_is_counted(self):
+        """Без счётчика подписчиков популярный автор не раскладывается"""
+        Counter.objects.filter(
+            key=counters.followers_key(self.star.pk)
+        ).delete()
+        Post.objects.create(author=self.star, text='Пост звезды')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists()
+        )
+        self.assertEqual(self.follow_page_texts(), ['Пост звезды'])
@@ -90,7 +90,8 @@ class PostCreateFormTests(TestCase):
                 text='Тестовый текст',
                 author=self.user,
                 group=self.group,
-                image='posts/small.gif'
+                image__startswith='posts/',
+                image__endswith='.gif',
             ).exists()
         )
 
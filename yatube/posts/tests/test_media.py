@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import media, thumbnails
+from posts.models import MediaFile, Post, ThumbnailJob
+from posts.storage import image_storage
+from posts.tests.test_thumbnails import image_file
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, name='photo.png'):
+        return Post.objects.create(
+            author=self.user, text='Текст', image=image_file(name)
+        )
+
+    def test_duplicates_share_one_file(self):
+        """Одинаковые загрузки хранятся одним файлом с одной очередью."""
+        first = self.create('first.png')
+        second = self.create('second.png')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            MediaFile.objects.get(name=first.image.name).references, 2
+        )
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+        files = os.listdir(os.path.dirname(first.image.path))
+        self.assertEqual(files, [os.path.basename(first.image.name)])
+
+    def test_collect_deletes_file_after_last_reference(self):
+        """Файл и миниатюры удаляются, только когда ссылок не осталось."""
+        first = self.create()
+        second = self.create()
+        name = first.image.name
+        thumbnails.generate(name)
+        first.delete()
+        self.assertEqual(media.collect(min_age=0), [])
+        self.assertTrue(image_storage.exists(name))
+
+        second.delete()
+        self.assertEqual(media.collect(min_age=0), [name])
+        self.assertFalse(image_storage.exists(name))
+        self.assertFalse(MediaFile.objects.exists())
+        self.assertFalse(thumbnails.is_ready(name))
+
+    def test_collect_keeps_file_referenced_again(self):
+        """Файл, на который сослались после выборки имён, не удаляется."""
+        post = self.create()
+        name = post.image.name
+        post.delete()
+        unreferenced = media.unreferenced
+
+        def upload_again(min_age):
+            names = unreferenced(min_age)
+            # тот же файл загружают снова, пока collect ещё работает
+            self.create()
+            return names
+
+        with mock.patch.object(media, 'unreferenced', upload_again):
+            self.assertEqual(media.collect(min_age=0), [])
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+    def test_edit_releases_old_image(self):
+        """Замена изображения освобождает ссылку на прежнее."""
+        post = self.create()
+        old_name = post.image.name
+        post.image = ContentFile(b'GIF89a', name='other.gif')
+        post.save()
+        self.assertEqual(MediaFile.objects.get(name=old_name).references, 0)
+        self.assertEqual(
+            MediaFile.objects.get(name=post.image.name).references, 1
+        )
+
+    def test_command_scans_untracked_files(self):
+        """Команда находит файлы, на которые не ссылается ни один пост."""
+        post = self.create()
+        orphan = image_storage.save(
+            'posts/legacy.gif', ContentFile(b'GIF89a legacy')
+        )
+        out = StringIO()
+        call_command(
+            'collect_media', scan=True, min_age=0, dry_run=True, stdout=out
+        )
+        self.assertIn(orphan, out.getvalue())
+        self.assertNotIn(post.image.name, out.getvalue())
+
+        call_command('collect_media', scan=True, min_age=0, stdout=StringIO())
+        self.assertFalse(image_storage.exists(orphan))
+        self.assertTrue(image_storage.exists(post.image.name))
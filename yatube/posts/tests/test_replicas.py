@@ -0,0 +1,105 @@
+import random
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import db
+from core.db import ReplicaRouter
+from posts import counters
+from posts.models import Post
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+class RecordingRouter(ReplicaRouter):
+    """Запоминает выбор базы, но читает с единственной тестовой базы"""
+    reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append(super().db_for_read(model, **hints))
+        return DEFAULT_DB_ALIAS
+
+
+@override_settings(
+    READ_REPLICAS=[REPLICA],
+    DATABASE_ROUTERS=[f'{__name__}.RecordingRouter'],
+)
+class ReplicaRoutingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        # иначе первое чтение счётчиков запишет их в базу
+        counters.rebuild()
+
+    def reads_for(self, url, client=None):
+        RecordingRouter.reads.clear()
+        response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return set(RecordingRouter.reads)
+
+    def test_read_only_views_use_replicas(self):
+        """Ленты и страница поста читают только с реплик."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.reads_for(url), {REPLICA})
+
+    @override_settings(READ_REPLICAS=[REPLICA, 'replica_2'])
+    def test_replica_chosen_once_per_request(self):
+        """Все чтения запроса идут на одну реплику, выбранную один раз."""
+        # у пользователя страница не отдаётся из кэша страниц
+        self.client.force_login(self.user)
+        url = reverse('posts:index')
+        for _ in range(5):
+            with mock.patch(
+                'core.db.random.choice', wraps=random.choice
+            ) as choice:
+                # сессия и пользователь читаются до представления
+                replicas = self.reads_for(url) - {DEFAULT_DB_ALIAS}
+            self.assertEqual(choice.call_count, 1)
+            self.assertEqual(len(replicas), 1)
+            self.assertIn(replicas.pop(), [REPLICA, 'replica_2'])
+
+    def test_other_views_use_primary(self):
+        """Формы записи читают с основной базы."""
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.reads_for(reverse('posts:post_create')), {DEFAULT_DB_ALIAS}
+        )
+
+    def test_author_reads_primary_after_write(self):
+        """После записи автор какое-то время читает с основной базы."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertIn(db.STICKY_COOKIE, response.cookies)
+        self.assertEqual(
+            self.reads_for(reverse('posts:index')), {DEFAULT_DB_ALIAS}
+        )
+        # у других посетителей cookie нет
+        self.assertEqual(
+            self.reads_for(reverse('posts:index'), self.client_class()),
+            {REPLICA},
+        )
+
+    def test_replicas_are_not_migrated(self):
+        """Миграции применяются только к основной базе."""
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate(REPLICA, 'posts'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
@@ -0,0 +1,130 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, SearchTerm
+from posts.views import POSTS_AMOUNT
+
+User = get_user_model()
+
+
+class SearchIndexMixin:
+    backend = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.settings_override = override_settings(
+            POST_SEARCH_BACKEND=cls.backend
+        )
+        cls.settings_override.enable()
+        cls.user = User.objects.create_user(username='auth')
+        cls.hedgehog = Post.objects.create(
+            author=cls.user, text='Ёжик в тумане ищет лошадку'
+        )
+        cls.horse = Post.objects.create(
+            author=cls.user, text='Лошадка заблудилась в тумане'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        super().tearDownClass()
+
+    def found(self, query):
+        return list(search.search(query).ids)
+
+    def test_all_words_must_match(self):
+        """Находятся посты со всеми словами запроса, регистр не важен."""
+        self.assertCountEqual(
+            self.found('ТУМАНЕ'), [self.hedgehog.pk, self.horse.pk]
+        )
+        self.assertEqual(self.found('туман ежик'), [])
+        self.assertEqual(self.found('ежик тумане'), [self.hedgehog.pk])
+        self.assertEqual(self.found('в'), [])
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при редактировании и удалении поста."""
+        self.hedgehog.text = 'Ёжик нашёл медвежонка'
+        self.hedgehog.save()
+        self.assertEqual(self.found('тумане'), [self.horse.pk])
+        self.assertEqual(self.found('медвежонка'), [self.hedgehog.pk])
+        self.horse.delete()
+        self.assertEqual(self.found('лошадка'), [])
+
+    def test_rebuild_indexes_posts_created_without_signals(self):
+        """rebuild_search_index находит посты, созданные bulk_create."""
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Медвежонок считает звёзды')
+        ])
+        self.assertEqual(self.found('звезды'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.found('звезды')), 1)
+
+
+class FtsSearchTest(SearchIndexMixin, TestCase):
+    backend = search.FTS5
+
+
+class TermSearchTest(SearchIndexMixin, TestCase):
+    backend = search.TERMS
+
+    def test_terms_are_stored(self):
+        """Слова поста хранятся без повторов и диакритики."""
+        self.assertCountEqual(
+            SearchTerm.objects.filter(post=self.hedgehog).values_list(
+                'term', flat=True
+            ),
+            ['ежик', 'тумане', 'ищет', 'лошадку'],
+        )
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for number in range(POSTS_AMOUNT + 3):
+            Post.objects.create(
+                author=cls.user, text=f'Запись про котиков номер {number}'
+            )
+        Post.objects.create(author=cls.user, text='Запись про собак')
+
+    def test_search_results_are_paginated(self):
+        """Результаты поиска разбиты на страницы с запросом в ссылках."""
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'котиков'})
+        self.assertEqual(response.context['paginator'].count, 13)
+        self.assertEqual(len(response.context['page_obj']), POSTS_AMOUNT)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA')
+        response = self.client.get(url, {'q': 'котиков', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 3)
+        for post in response.context['page_obj']:
+            self.assertIn('котиков', post.text)
+
+    def test_empty_query(self):
+        """Пустой запрос показывает форму без результатов."""
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['paginator'].count, 0)
+
+    def test_admin_changelist_uses_index(self):
+        """Поиск в админке находит посты через индекс."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_benchmark_command(self):
+        """Бенчмарк выводит время обоих способов поиска."""
+        out = StringIO()
+        call_command('benchmark_search', 'котиков', repeat=1, stdout=out)
+        self.assertIn("'котиков': icontains", out.getvalue())
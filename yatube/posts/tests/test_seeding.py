@@ -0,0 +1,63 @@
+import statistics
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F
+from django.test import TestCase
+
+from posts import counters, search
+from posts.models import Comment, Follow, Post, User
+
+
+class SeedCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.out = StringIO()
+        call_command(
+            'seed', 400, users=60, groups=10, comments=300, follows=600,
+            batch_size=100, random_seed=1, stdout=cls.out,
+        )
+
+    def test_creates_requested_volumes(self):
+        """Создаются все модели в заданном количестве."""
+        self.assertEqual(Post.objects.count(), 400)
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertGreater(Follow.objects.count(), 500)
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')
+        ).exists())
+
+    def test_popularity_is_skewed(self):
+        """У популярных авторов и групп гораздо больше остальных."""
+        followers = list(User.objects.annotate(
+            size=Count('following')
+        ).values_list('size', flat=True))
+        self.assertGreater(max(followers), statistics.median(followers) * 5)
+        groups = list(Post.objects.filter(
+            group__isnull=False
+        ).order_by().values('group').annotate(
+            size=Count('pk')
+        ).values_list('size', flat=True))
+        self.assertGreater(max(groups), statistics.mean(groups) * 2)
+
+    def test_derived_data_is_consistent(self):
+        """Счётчики, число комментариев и поиск сходятся с таблицами."""
+        self.assertEqual(counters.all_posts_count(), 400)
+        self.assertEqual(counters.repair_comment_counts(), [])
+        word = Post.objects.first().text.split()[0]
+        self.assertTrue(search.search(word).ids)
+
+    def test_reports_throughput(self):
+        """Команда выводит скорость вставки по каждой модели."""
+        report = self.out.getvalue()
+        for step in ('users', 'groups', 'posts', 'comments', 'follows'):
+            self.assertIn(f'{step}: ', report)
+        self.assertIn('строк/с', report)
+
+    def test_rejects_bad_batch_size(self):
+        """Размер пачки меньше 1 — ошибка команды."""
+        with self.assertRaises(CommandError):
+            call_command('seed', 10, batch_size=0, stdout=StringIO())
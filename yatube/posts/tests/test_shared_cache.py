@@ -0,0 +1,135 @@
+import json
+import time
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from core.cache.backends import RedisCache, TieredCache
+from core.cache.server import FakeRedisServer
+
+
+class SharedCacheTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeRedisServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.store.databases.clear()
+        self.server.store.expires.clear()
+
+    def shared_cache(self):
+        """Отдельный экземпляр бэкенда, как в другом процессе"""
+        return RedisCache(self.server.url, {})
+
+
+class RedisCacheTest(SharedCacheTestCase):
+    def test_values_are_shared_between_instances(self):
+        """Запись через один экземпляр видна другому."""
+        first, second = self.shared_cache(), self.shared_cache()
+        first.set('feed', {'posts': [1, 2]})
+        first.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(second.get('feed'), {'posts': [1, 2]})
+        self.assertEqual(second.get_many(['a', 'b', 'c']), {
+            'a': 1, 'b': 'два'
+        })
+        second.delete('feed')
+        self.assertIsNone(first.get('feed'))
+
+    def test_add_incr_and_missing_keys(self):
+        """add не перезаписывает, incr атомарен и не создаёт ключ."""
+        cache = self.shared_cache()
+        self.assertTrue(cache.add('generation', 1, None))
+        self.assertFalse(cache.add('generation', 5, None))
+        self.assertEqual(cache.incr('generation'), 2)
+        self.assertEqual(self.shared_cache().incr('generation', 10), 12)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        self.assertFalse(cache.has_key('missing'))
+
+    def test_timeout(self):
+        """Ключ истекает по таймауту, timeout=None хранит вечно."""
+        cache = self.shared_cache()
+        cache.set('short', 'value', 0.05)
+        cache.set('forever', 'value', None)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('forever'), 'value')
+        self.assertTrue(cache.touch('forever', 0.05))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('forever'))
+
+
+class TieredCacheTest(SharedCacheTestCase):
+    def tiered_caches(self):
+        settings = {
+            'default': {
+                'BACKEND': 'core.cache.backends.TieredCache',
+                'LOCATION': 'shared',
+                'OPTIONS': {'LOCAL_PREFIXES': ['template.cache.']},
+            },
+            'shared': {
+                'BACKEND': 'core.cache.backends.RedisCache',
+                'LOCATION': self.server.url,
+            },
+        }
+        return override_settings(CACHES=settings)
+
+    def test_local_tier_serves_only_configured_prefixes(self):
+        """Фрагменты читаются из памяти, остальные ключи из общего кэша."""
+        with self.tiered_caches():
+            cache = caches['default']
+            self.assertIsInstance(cache, TieredCache)
+            cache.set('template.cache.index', '<ul>')
+            cache.set('generation:index', 1, None)
+            self.server.store.databases.clear()
+            self.assertEqual(cache.get('template.cache.index'), '<ul>')
+            self.assertIsNone(cache.get('generation:index'))
+
+    def test_local_lru_is_bounded(self):
+        """Локальный уровень вытесняет давно не читанные ключи."""
+        cache = TieredCache('shared', {'OPTIONS': {
+            'LOCAL_PREFIXES': ['hot:'], 'LOCAL_MAX_ENTRIES': 2,
+        }})
+        with self.tiered_caches():
+            for key in ('hot:a', 'hot:b', 'hot:c'):
+                cache.set(key, key)
+            self.server.store.databases.clear()
+            self.assertEqual(cache.get_many(['hot:a', 'hot:b', 'hot:c']), {
+                'hot:b': 'hot:b', 'hot:c': 'hot:c'
+            })
+
+    def test_invalidation_reaches_other_processes(self):
+        """Сброс ленты в одном процессе виден в другом."""
+        with self.tiered_caches():
+            response = self.client.get(reverse('posts:index'))
+            generation = response.context['feed_generation']
+            # другой процесс сбрасывает ленту через свой экземпляр кэша
+            self.shared_cache().incr('generation:index')
+            response = self.client.get(reverse('posts:index'))
+            self.assertNotEqual(
+                response.context['feed_generation'], generation
+            )
+
+    def test_metrics_are_shared_between_processes(self):
+        """show_metrics видит метрики, записанные другим процессом."""
+        with self.tiered_caches():
+            metrics.incr('page_cache.hit', 3)
+            metrics.gauge('timeline.fanout_limit', 10)
+            # другой процесс увеличивает ту же метрику
+            self.shared_cache().incr('metrics:page_cache.hit')
+            out = StringIO()
+            call_command('show_metrics', reset=True, stdout=out)
+            self.assertEqual(json.loads(out.getvalue()), {
+                'page_cache.hit': 4, 'timeline.fanout_limit': 10,
+            })
+            self.assertEqual(metrics.snapshot(), {})
@@ -0,0 +1,156 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post, ThumbnailJob
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name='photo.png', color=(200, 0, 0)):
+    content = BytesIO()
+    Image.new('RGB', (40, 20), color).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_saving_image_enqueues_job(self):
+        """Новое изображение ставится в очередь, повторное сохранение нет."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=image_file()
+        )
+        job = ThumbnailJob.objects.get(image=post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        ThumbnailJob.objects.all().delete()
+        post.text = 'Новый текст'
+        post.save()
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_page_does_not_generate_thumbnail(self):
+        """Страница показывает исходное изображение до обработки очереди."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=image_file()
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        response = self.client.get(url)
+        self.assertContains(response, post.image.url)
+        self.assertNotContains(response, 'srcset')
+        self.assertFalse(thumbnails.is_ready(post.image.name))
+
+        self.assertEqual(thumbnails.process(workers=1), (1, 0))
+        job = ThumbnailJob.objects.get(image=post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(thumbnails.is_ready(post.image.name))
+        response = self.client.get(url)
+        self.assertNotContains(response, post.image.url)
+        picture = response.context['picture']
+        self.assertContains(response, picture.src)
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertIn(f' {width}w', picture.srcset)
+        self.assertEqual(
+            picture.sizes, settings.POST_IMAGE_SIZES['aside']
+        )
+
+    def test_variants_keep_card_aspect(self):
+        """Варианты всех ширин обрезаются до пропорций карточки."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=image_file()
+        )
+        thumbnails.generate(post.image.name)
+        for variant in thumbnails.variants('JPEG'):
+            width, height = thumbnails.cached(post.image, variant).size
+            self.assertEqual(width, variant.width)
+            self.assertEqual(round(width * 339 / 960), height)
+
+    @override_settings(POST_IMAGE_FORMATS=('AVIF', 'BOGUS', 'JPEG'))
+    def test_unsupported_formats_are_skipped(self):
+        """Форматы, которые Pillow не умеет записывать, пропускаются."""
+        Image.init()
+        expected = ['JPEG']
+        if 'AVIF' in Image.SAVE:
+            expected.insert(0, 'AVIF')
+        self.assertEqual(thumbnails.formats(), expected)
+        name = thumbnails.ThumbnailBackend()._get_thumbnail_filename(
+            ImageFile('posts/photo.png'), '10x10', {'format': 'AVIF'}
+        )
+        self.assertTrue(name.endswith('.avif'))
+
+    @override_settings(THUMBNAIL_MAX_ATTEMPTS=2)
+    def test_broken_image_fails_after_attempts(self):
+        """Битое изображение повторяется и затем помечается ошибкой."""
+        thumbnails.enqueue('posts/missing.png')
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(thumbnails.process(workers=1), (0, 1))
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(thumbnails.process(workers=1), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.FAILED)
+        self.assertTrue(job.error)
+        self.assertEqual(thumbnails.process(workers=1), (0, 0))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text='Текст', image=image_file(color=color)
+            )
+            for color in ((200, 0, 0), (0, 200, 0))
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_skips_ready_images(self):
+        """Прогрев создаёт миниатюры и при повторе пропускает готовые."""
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('Готово: 2, с ошибкой: 0', out.getvalue())
+        for post in self.posts:
+            self.assertTrue(thumbnails.is_ready(post.image.name))
+
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('уже готово: 2', out.getvalue())
+        self.assertIn('Готово: 0, с ошибкой: 0', out.getvalue())
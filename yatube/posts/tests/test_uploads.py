@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# теги EXIF: модель камеры и ориентация снимка
+MODEL = 0x0110
+ORIENTATION = 0x0112
+# EXIF хранит строки в ASCII: так модель камеры видна в байтах файла
+CAMERA = 'Canon EOS 5D'
+
+
+def jpeg_file(size, name='photo.jpg', orientation=None):
+    content = BytesIO()
+    exif = Image.Exif()
+    exif[MODEL] = 'Камера'
+    if orientation:
+        exif[ORIENTATION] = orientation
+    Image.new('RGB', size, (0, 120, 200)).save(
+        content, 'JPEG', exif=exif.tobytes()
+    )
+    return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+
+def png_file(size, name='drawing.png'):
+    content = BytesIO()
+    exif = Image.Exif()
+    exif[MODEL] = CAMERA
+    Image.new('RGBA', size, (0, 120, 200, 128)).save(
+        content, 'PNG', exif=exif.tobytes(), icc_profile=b'profile'
+    )
+    return SimpleUploadedFile(name, content.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=100)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Текст', 'image': image},
+        )
+
+    def test_image_is_resized_and_stripped(self):
+        """Изображение уменьшается, поворачивается по EXIF и теряет его."""
+        response = self.create(jpeg_file((400, 200), orientation=6))
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertFalse(image.getexif())
+        self.assertTrue(post.image.name.endswith('.jpg'))
+
+    def test_png_metadata_is_stripped(self):
+        """PNG пересохраняется без EXIF и профиля, прозрачность остаётся."""
+        response = self.create(png_file((400, 200)))
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        with open(post.image.path, 'rb') as file:
+            self.assertNotIn(CAMERA.encode(), file.read())
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertFalse(image.getexif())
+            self.assertNotIn('icc_profile', image.info)
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_large_file_is_rejected(self):
+        """Файл больше лимита не сохраняется, форма объясняет почему."""
+        image = SimpleUploadedFile(
+            'big.jpg', b'\xff\xd8' + b'0' * 4096, 'image/jpeg'
+        )
+        response = self.create(image)
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].errors['image']
+        self.assertIn('Файл больше', errors[0])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_is_rejected(self):
+        """Изображение с лишними пикселями отклоняется до декодирования."""
+        response = self.create(jpeg_file((100, 20)))
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].errors['image']
+        self.assertIn('Мп', errors[0])
+        self.assertFalse(Post.objects.exists())
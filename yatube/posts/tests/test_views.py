@@ -1,12 +1,22 @@
+import hashlib
 import shutil
 import tempfile
+from unittest import skipUnless
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
-from posts.models import Post, Group
+from django.core.cache import cache
+from django.db import connection
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.utils import timezone
+from core.pagination import NEXT, PREVIOUS, CursorPaginator
+from posts import counters
+from posts.models import Comment, Post, Group, Follow
+from posts.views import POSTS_AMOUNT
 
 
 User = get_user_model()
@@ -50,6 +60,7 @@ class PostsPagesTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -122,7 +133,8 @@ class PostsPagesTest(TestCase):
         self.assertEqual(post_author_0, 'auth')
         self.assertEqual(post_text_0, 'Тестовый текст')
         self.assertEqual(post_group_0, 'Тестовая группа')
-        self.assertEqual(post_image_0, 'posts/small.gif')
+        digest = hashlib.sha256(self.image).hexdigest()
+        self.assertEqual(post_image_0, f'posts/{digest[:2]}/{digest}.gif')
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -236,6 +248,7 @@ class PaginatorViewsTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -271,3 +284,178 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
                 self.assertEqual(len(response.context['page_obj']), posts)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    ALL_POSTS = 25
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {x}', group=cls.group, author=cls.user)
+            for x in range(cls.ALL_POSTS)
+        )
+        # одинаковая дата у всех постов: порядок задаёт только pk
+        Post.objects.update(created=timezone.now())
+        cls.url = reverse('posts:group_list', kwargs={'slug': 'test_group'})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_next_cursor_walks_whole_feed(self):
+        """Переход по курсорам показывает каждый пост ровно один раз."""
+        expected = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)
+        )
+        response = self.guest_client.get(self.url)
+        seen = [post.pk for post in response.context['page_obj']]
+        while response.context['page_obj'].has_next():
+            cursor = str(response.context['page_obj'].next_cursor)
+            response = self.guest_client.get(self.url, {'cursor': cursor})
+            self.assertIsNone(response.context['page_obj'].number)
+            seen.extend(post.pk for post in response.context['page_obj'])
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_same_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        first = self.guest_client.get(self.url).context['page_obj']
+        second = self.guest_client.get(
+            self.url, {'cursor': str(first.next_cursor)}
+        ).context['page_obj']
+        third = self.guest_client.get(
+            self.url, {'cursor': second.next_cursor}
+        ).context['page_obj']
+        back = self.guest_client.get(
+            self.url, {'cursor': third.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(second))
+        top = self.guest_client.get(
+            self.url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(top.number, 1)
+        self.assertEqual(list(top), list(first))
+
+    def test_last_cursor_shows_oldest_posts(self):
+        """Ссылка на последнюю страницу не использует OFFSET."""
+        first = self.guest_client.get(self.url).context['page_obj']
+        last = self.guest_client.get(
+            self.url, {'cursor': first.paginator.last_cursor}
+        ).context['page_obj']
+        oldest = Post.objects.order_by('pk')[:POSTS_AMOUNT]
+        self.assertEqual(list(last), list(oldest)[::-1])
+        self.assertFalse(last.has_next())
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.guest_client.get(self.url, {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 404)
+
+    @skipUnless(connection.vendor == 'sqlite', 'план запроса SQLite')
+    def test_cursor_reads_index_range(self):
+        """Переход по курсору ограничен по дате, а не читает всё новее."""
+        post = Post.objects.first()
+        feeds = {
+            'index': Post.objects.feed(),
+            'group': Post.objects.feed().filter(group=self.group),
+            'profile': Post.objects.feed().filter(author=self.user),
+            'comments': Comment.objects.for_display().filter(post=post),
+        }
+        bounds = {NEXT: 'created<?', PREVIOUS: 'created>?'}
+        for name, queryset in feeds.items():
+            paginator = CursorPaginator(queryset, POSTS_AMOUNT)
+            for direction, bound in bounds.items():
+                with self.subTest(feed=name, direction=direction):
+                    plan = paginator.seek(
+                        direction, post.created, post.pk
+                    )[:POSTS_AMOUNT + 1].explain()
+                    self.assertIn(bound, plan)
+                    self.assertNotIn('SCAN', plan)
+
+
+class PageNavigationTest(TestCase):
+    MAX_ITEMS = 15
+
+    def render(self, page):
+        return render_to_string(
+            'posts/includes/paginator.html', {'page_obj': page}
+        )
+
+    def test_navigation_size_does_not_depend_on_page_count(self):
+        """Навигация по ленте из 100 000 страниц остаётся короткой."""
+        paginator = Paginator(range(POSTS_AMOUNT * 100_000), POSTS_AMOUNT)
+        for number in (1, 2, 7, 50_000, 99_996, 100_000):
+            with self.subTest(page=number):
+                html = self.render(paginator.page(number))
+                self.assertLessEqual(html.count('<li'), self.MAX_ITEMS)
+                self.assertLess(len(html), 3000)
+                self.assertIn(f'<span class="page-link">{number}</span>', html)
+                self.assertIn('>100000</', html)
+                if number > 1:
+                    self.assertIn(f'href="?page={number - 1}"', html)
+
+    def test_short_feed_lists_every_page(self):
+        """Если страниц мало, выводятся все номера без пропусков."""
+        paginator = Paginator(range(POSTS_AMOUNT * 5), POSTS_AMOUNT)
+        html = self.render(paginator.page(3))
+        for number in range(1, 6):
+            self.assertIn(f'>{number}</', html)
+        self.assertNotIn('…', html)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Имя', last_name='Фамилия'
+        )
+        cls.follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        for x in range(POSTS_AMOUNT):
+            author = User.objects.create_user(username=f'author{x}')
+            Follow.objects.create(user=cls.follower, author=author)
+            Post.objects.create(
+                text=f'Пост {x}', group=cls.group, author=author
+            )
+            Post.objects.create(
+                text=f'Пост {x}', group=cls.group, author=cls.user
+            )
+        counters.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_feed_pages_query_count(self):
+        feeds = {
+            reverse('posts:index'): (self.guest_client, 2),
+            reverse('posts:group_list', kwargs={
+                'slug': self.group.slug
+            }): (self.guest_client, 3),
+            reverse('posts:profile', kwargs={
+                'username': self.user.username
+            }): (self.guest_client, 3),
+            reverse('posts:follow_index'): (self.follower_client, 5),
+        }
+        for url, (client, queries) in feeds.items():
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']), POSTS_AMOUNT
+                )
@@ -0,0 +1,289 @@
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import base, default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+from . import caching, media
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+
+def _options(source, options):
+    """Опции с теми же значениями по умолчанию, что и в get_thumbnail"""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """Бэкенд sorl, который знает расширения форматов новее WebP"""
+    extensions = dict(base.EXTENSIONS, AVIF='avif')
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = self.extensions[options['format']]
+        return f'{sorl_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+
+Variant = namedtuple('Variant', 'format width geometry options')
+
+
+def formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет записывать Pillow"""
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def variants(image_format):
+    """Варианты изображения для srcset одного формата"""
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    return [
+        Variant(
+            image_format,
+            width,
+            f'{width}x{round(width * aspect_height / aspect_width)}',
+            dict(settings.POST_IMAGE_OPTIONS, format=image_format),
+        )
+        for width in settings.POST_IMAGE_WIDTHS
+    ]
+
+
+def all_variants():
+    return [
+        variant
+        for image_format in formats()
+        for variant in variants(image_format)
+    ]
+
+
+def cached(file_, variant):
+    """
+    Готовый вариант изображения из хранилища sorl или None.
+
+    В отличие от get_thumbnail никогда не генерирует изображение,
+    поэтому безопасна для вызова при отрисовке страницы.
+    """
+    source = media.source_file(file_)
+    name = default.backend._get_thumbnail_filename(
+        source, variant.geometry, _options(source, variant.options)
+    )
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def is_ready(name):
+    """Созданы ли все варианты изображения"""
+    return all(cached(name, variant) for variant in all_variants())
+
+
+Picture = namedtuple('Picture', 'src srcset sources sizes width height')
+Source = namedtuple('Source', 'type srcset')
+
+
+def _ready_urls(file_, format_variants):
+    """URL всех вариантов формата или None, если какого-то ещё нет"""
+    urls = []
+    for variant in format_variants:
+        thumbnail = cached(file_, variant)
+        if not thumbnail:
+            return None
+        urls.append(thumbnail.url)
+    return urls
+
+
+def _srcset(urls, format_variants):
+    return ', '.join(
+        f'{url} {variant.width}w'
+        for url, variant in zip(urls, format_variants)
+    )
+
+
+def picture(file_, layout):
+    """
+    Данные для разметки <picture> из уже созданных вариантов.
+
+    Формат попадает в разметку, только если готовы все его ширины.
+    Пока нет запасного формата, выводится исходное изображение.
+    """
+    sizes = settings.POST_IMAGE_SIZES[layout]
+    *preferred, fallback = formats()
+    fallback_variants = variants(fallback)
+    urls = _ready_urls(file_, fallback_variants)
+    if urls is None:
+        return Picture(file_.url, '', [], sizes, None, None)
+    sources = []
+    for image_format in preferred:
+        format_variants = variants(image_format)
+        format_urls = _ready_urls(file_, format_variants)
+        if format_urls:
+            sources.append(Source(
+                Image.MIME.get(image_format, f'image/{image_format.lower()}'),
+                _srcset(format_urls, format_variants),
+            ))
+    # браузеры без srcset получают вариант ширины исходной карточки
+    base_width = settings.POST_IMAGE_ASPECT[0]
+    src = min(
+        range(len(fallback_variants)),
+        key=lambda index: abs(fallback_variants[index].width - base_width),
+    )
+    width, height = fallback_variants[src].geometry.split('x')
+    return Picture(
+        urls[src], _srcset(urls, fallback_variants), sources, sizes,
+        width, height,
+    )
+
+
+def generate(name):
+    """Создаёт все варианты изображения для srcset"""
+    for variant in all_variants():
+        thumbnail = get_thumbnail(
+            media.source_file(name), variant.geometry, **variant.options
+        )
+        # sorl не бросает исключение для отсутствующего или битого
+        # файла, а возвращает пустую миниатюру
+        if not thumbnail.exists():
+            raise OSError(f'Не удалось прочитать изображение {name}')
+
+
+def enqueue(name):
+    """Ставит изображение в очередь на генерацию миниатюр"""
+    ThumbnailJob.objects.update_or_create(
+        image=name,
+        defaults={'status': ThumbnailJob.PENDING, 'attempts': 0, 'error': ''},
+    )
+
+
+def requeue_stale():
+    """Возвращает в очередь задания, брошенные упавшим обработчиком"""
+    stale = timezone.now() - timedelta(seconds=settings.THUMBNAIL_STALE_AFTER)
+    return ThumbnailJob.objects.filter(
+        status=ThumbnailJob.RUNNING, updated__lt=stale
+    ).update(status=ThumbnailJob.PENDING)
+
+
+def claim(limit):
+    """
+    Забирает из очереди до limit заданий.
+
+    На PostgreSQL строки блокируются с SKIP LOCKED, так что несколько
+    обработчиков не получат одно и то же задание.
+    """
+    with transaction.atomic():
+        jobs = list(ThumbnailJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(status=ThumbnailJob.PENDING).order_by(
+            'created'
+        ).values_list('pk', 'image')[:limit])
+        ThumbnailJob.objects.filter(pk__in=[pk for pk, _ in jobs]).update(
+            status=ThumbnailJob.RUNNING,
+            attempts=F('attempts') + 1,
+            updated=timezone.now(),
+        )
+    return jobs
+
+
+def _run(name):
+    """Выполняется в процессе пула; ошибка возвращается, а не бросается"""
+    try:
+        generate(name)
+    except Exception as error:
+        logger.exception('Не удалось создать миниатюры %s', name)
+        return name, repr(error)
+    return name, ''
+
+
+def _finish(results):
+    failed = {name: error for name, error in results if error}
+    done = [name for name, error in results if not error]
+    ThumbnailJob.objects.filter(image__in=done).update(
+        status=ThumbnailJob.DONE, error='', updated=timezone.now()
+    )
+    for name, error in failed.items():
+        ThumbnailJob.objects.filter(
+            image=name, attempts__lt=settings.THUMBNAIL_MAX_ATTEMPTS
+        ).update(status=ThumbnailJob.PENDING, error=error)
+        ThumbnailJob.objects.filter(
+            image=name, attempts__gte=settings.THUMBNAIL_MAX_ATTEMPTS
+        ).update(status=ThumbnailJob.FAILED, error=error)
+    metrics.incr('thumbnails.generated', len(done))
+    metrics.incr('thumbnails.failed', len(failed))
+
+    # закэшированные фрагменты лент показывают исходное изображение,
+    # пока миниатюры не было
+    scopes = set()
+    refs = Post.objects.filter(image__in=done).values_list(
+        'pk', 'author_id', 'group_id'
+    )
+    for post_id, author_id, group_id in refs:
+        scopes.update(caching.post_scopes(author_id, group_id))
+        scopes.add(caching.card_scope(post_id))
+    if scopes:
+        caching.bump(*scopes)
+    return len(done), len(failed)
+
+
+def process(limit=None, workers=None):
+    """
+    Обрабатывает одну порцию очереди.
+
+    При workers > 1 миниатюры создаются в пуле процессов: генерация
+    нагружает процессор, и отрисовка страниц её не ждёт.
+    Возвращает количество успешных и неудачных заданий.
+    """
+    limit = limit or settings.THUMBNAIL_BATCH
+    workers = workers or settings.THUMBNAIL_WORKERS
+    requeue_stale()
+    names = [name for _, name in claim(limit)]
+    if not names:
+        return 0, 0
+    return _finish(list(run_all(names, workers)))
+
+
+def run_all(names, workers, chunksize=1):
+    """
+    Создаёт миниатюры для names и по мере готовности отдаёт пары
+    (имя, ошибка).
+    """
+    if workers <= 1:
+        yield from map(_run, names)
+        return
+    # соединения с БД нельзя разделять с дочерними процессами
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_run, names, chunksize=chunksize)
+
+
+def source_images():
+    """Имена всех загруженных изображений постов в MEDIA_ROOT"""
+    upload_to = Post._meta.get_field('image').upload_to
+    root = os.path.join(settings.MEDIA_ROOT, upload_to)
+    for path, _, files in os.walk(root):
+        for file_name in sorted(files):
+            yield os.path.relpath(
+                os.path.join(path, file_name), settings.MEDIA_ROOT
+            ).replace(os.sep, '/')
@@ -0,0 +1,266 @@
+import heapq
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+
+from core import metrics
+from . import caching, counters
+from .models import Follow, Post, TimelineEntry
+
+READ = 'read'
+WRITE = 'write'
+HYBRID = 'hybrid'
+
+# ключ перехода по курсору для ленты, читаемой по индексу TimelineEntry
+TIMELINE_KEY_FIELDS = ('timeline_created', 'timeline_post')
+
+FollowFeed = namedtuple('FollowFeed', 'posts count key_fields')
+
+
+def fan_out_enabled():
+    return settings.FOLLOW_TIMELINE in (WRITE, HYBRID)
+
+
+def high_follower_authors():
+    """
+    Авторы, чьи посты не раскладываются по лентам при публикации.
+
+    В режиме HYBRID это авторы, у которых подписчиков больше
+    FOLLOW_TIMELINE_FANOUT_LIMIT: их посты подмешиваются при чтении.
+    Сюда же входят авторы, чьи посты уже пропускались при раскладке:
+    в лентах не хватает части их постов, поэтому они подмешиваются,
+    даже когда подписчиков стало меньше, пока ленты не перестроены.
+    """
+    if settings.FOLLOW_TIMELINE != HYBRID:
+        return []
+    limit = settings.FOLLOW_TIMELINE_FANOUT_LIMIT
+    metrics.gauge('timeline.fanout_limit', limit)
+    return sorted({
+        *counters.authors_with_followers_over(limit),
+        *counters.merged_authors(),
+    })
+
+
+def _merged_on_read(author_id):
+    """
+    Подмешиваются ли посты автора при чтении.
+
+    Счётчик подписчиков появляется после первой подписки или
+    rebuild_counters; если его ещё нет, подписчики считаются COUNT.
+    """
+    if author_id in high_follower_authors():
+        return True
+    return settings.FOLLOW_TIMELINE == HYBRID and counters.followers_count(
+        author_id
+    ) > settings.FOLLOW_TIMELINE_FANOUT_LIMIT
+
+
+def _entries(user_ids, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+        for user_id in user_ids
+        for post_id, created in posts
+    ]
+
+
+def _followers(author_id):
+    """Подписчики автора пачками по FOLLOW_TIMELINE_BATCH"""
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    while True:
+        user_ids = list(islice(followers, settings.FOLLOW_TIMELINE_BATCH))
+        if not user_ids:
+            return
+        yield user_ids
+
+
+def _touch(user_ids):
+    caching.bump(*map(caching.timeline_scope, user_ids))
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора"""
+    if _merged_on_read(post.author_id):
+        counters.mark_merged(post.author_id)
+        metrics.incr('timeline.fanout.skipped')
+        return
+    rows = 0
+    for user_ids in _followers(post.author_id):
+        rows += len(TimelineEntry.objects.bulk_create(
+            _entries(user_ids, [(post.pk, post.created)]),
+            ignore_conflicts=True,
+        ))
+        # каждый новый пост удлиняет ленту: обрезаем её сразу
+        trim_users(user_ids)
+        _touch(user_ids)
+    metrics.incr('timeline.fanout.rows', rows)
+
+
+def posts_changed(author_id):
+    """
+    Сбрасывает версии лент, в которые разложены посты автора.
+
+    Нужно после правки или удаления поста и изменения числа его
+    комментариев: карточка в ленте подписок меняется.
+    """
+    if _merged_on_read(author_id):
+        # такие посты подмешиваются при чтении, ленту с ними
+        # проверяет author_scope
+        return
+    for user_ids in _followers(author_id):
+        _touch(user_ids)
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика"""
+    _touch([user_id])
+    if _merged_on_read(author_id):
+        counters.mark_merged(author_id)
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-created', '-pk'
+    ).values_list('pk', 'created')[:settings.FOLLOW_TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], posts),
+        batch_size=settings.FOLLOW_TIMELINE_BATCH,
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки"""
+    _touch([user_id])
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim(user_id):
+    """Оставляет в ленте не больше FOLLOW_TIMELINE_LENGTH записей"""
+    trim_users([user_id])
+
+
+def trim_users(user_ids):
+    """
+    Обрезает ленты нескольких пользователей одним запросом.
+
+    Граница каждой ленты — дата последней сохраняемой записи, она
+    выбирается подзапросом по индексу.
+    """
+    length = settings.FOLLOW_TIMELINE_LENGTH
+    boundary = TimelineEntry.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by('-created').values('created')[length - 1:length]
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids, created__lt=Subquery(boundary)
+    ).delete()
+
+
+def trim_all():
+    users = TimelineEntry.objects.order_by().values_list(
+        'user_id', flat=True
+    ).distinct()
+    for user_id in users.iterator():
+        trim(user_id)
+
+
+def rebuild():
+    """Заполняет ленты заново по текущим подпискам"""
+    TimelineEntry.objects.all().delete()
+    # в новых лентах пропущенных постов нет: отметки снова ставит
+    # backfill для авторов, которые не раскладываются
+    counters.clear_merged()
+    follows = Follow.objects.values_list('user_id', 'author_id').iterator()
+    for user_id, author_id in follows:
+        backfill(user_id, author_id)
+
+
+class MergedTimeline:
+    """
+    Слияние нескольких упорядоченных по дате лент (k-way merge).
+
+    Поддерживает ровно то, что нужно CursorPaginator: order_by, filter
+    и срезы. Из каждого источника читается не больше записей, чем
+    нужно для запрошенного среза.
+    """
+
+    def __init__(self, sources, descending=True):
+        self.sources = sources
+        self.descending = descending
+
+    def order_by(self, *fields):
+        return MergedTimeline(
+            [source.order_by(*fields) for source in self.sources],
+            descending=fields[0].startswith('-'),
+        )
+
+    def filter(self, *args, **kwargs):
+        return MergedTimeline(
+            [source.filter(*args, **kwargs) for source in self.sources],
+            self.descending,
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        started = time.monotonic()
+        rows = [list(source[:stop]) for source in self.sources]
+        merged = list(islice(heapq.merge(
+            *rows,
+            key=lambda post: (post.created, post.pk),
+            reverse=self.descending,
+        ), start, stop))
+        metrics.incr('timeline.merge.requests')
+        metrics.incr('timeline.merge.sources', len(self.sources))
+        metrics.incr('timeline.merge.rows', sum(map(len, rows)))
+        metrics.incr(
+            'timeline.merge.ms', int((time.monotonic() - started) * 1000)
+        )
+        return merged
+
+
+def merged_authors(user):
+    """Авторы из подписок пользователя, чьи посты подмешиваются при чтении"""
+    authors = high_follower_authors()
+    if not authors:
+        return []
+    return sorted(Follow.objects.filter(
+        user=user, author_id__in=authors
+    ).values_list('author_id', flat=True))
+
+
+def follow_feed(user, merged=None):
+    """
+    Лента подписок из предвычисленной ленты.
+
+    Посты авторов с большим числом подписчиков берутся напрямую
+    и сливаются с предвычисленной лентой остальных авторов. Их
+    список можно передать в merged, если он уже прочитан.
+    """
+    if merged is None:
+        merged = merged_authors(user)
+    posts = Post.objects.feed().filter(timeline_entries__user=user)
+    count = TimelineEntry.objects.filter(user=user)
+    if not merged:
+        posts = posts.annotate(
+            timeline_created=F('timeline_entries__created'),
+            timeline_post=F('timeline_entries__post'),
+        )
+        return FollowFeed(posts, count.count(), TIMELINE_KEY_FIELDS)
+    posts = posts.exclude(author_id__in=merged)
+    count = count.exclude(post__author_id__in=merged).count()
+    sources = [posts] + [
+        Post.objects.feed().filter(author_id=author_id)
+        for author_id in merged
+    ]
+    return FollowFeed(
+        MergedTimeline(sources),
+        count + counters.authors_posts_count(merged),
+        None,
+    )
@@ -0,0 +1,121 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемые файлы на диск частями, не держа их в памяти.
+
+    Когда файл превышает POST_IMAGE_MAX_UPLOAD_SIZE, остаток не
+    сохраняется, а у файла выставляется признак too_large: форма
+    покажет ошибку, не пытаясь разобрать обрезанное изображение.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.too_large:
+            return None
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.too_large = True
+            self.file.truncate(0)
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.too_large = self.too_large
+        return upload
+
+
+def too_large_error():
+    return forms.ValidationError(
+        'Файл больше %(limit)s',
+        code='too_large',
+        params={
+            'limit': filesizeformat(settings.POST_IMAGE_MAX_UPLOAD_SIZE)
+        },
+    )
+
+
+# что из Image.info нужно для записи самих пикселей; остальное —
+# EXIF, ICC-профиль, XMP и текстовые поля — при пересохранении теряется
+KEPT_INFO = ('transparency', 'background')
+
+
+def _output_format(image):
+    """Исходный формат, если Pillow умеет его записывать"""
+    if image.format in Image.SAVE:
+        return image.format
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    return 'PNG' if has_alpha else 'JPEG'
+
+
+def normalize_image(upload):
+    """
+    Проверяет размер загруженного изображения и пересохраняет его.
+
+    Размер в пикселях читается из заголовка до декодирования. Затем
+    изображение поворачивается по EXIF, уменьшается до
+    POST_IMAGE_MAX_SIDE и сохраняется заново уже без метаданных.
+    JPEG декодируется сразу в уменьшенном масштабе.
+
+    Анимированные изображения сохраняются как загружены, вместе с
+    метаданными: пересборка потребовала бы декодировать все кадры.
+    """
+    if getattr(upload, 'too_large', False) or (
+        upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE
+    ):
+        raise too_large_error()
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Изображение больше %(limit)s Мп',
+                code='too_many_pixels',
+                params={
+                    'limit': round(settings.POST_IMAGE_MAX_PIXELS / 10 ** 6, 1)
+                },
+            )
+        if getattr(image, 'is_animated', False):
+            # анимацию не пересобираем: кадры придётся декодировать все
+            upload.seek(0)
+            return upload
+
+        image_format = _output_format(image)
+        name = upload.name
+        if image_format != image.format:
+            name = f'{os.path.splitext(name)[0]}.{image_format.lower()}'
+        side = settings.POST_IMAGE_MAX_SIDE
+        image.draft(image.mode, (side, side))
+        normalized = ImageOps.exif_transpose(image)
+        normalized.thumbnail((side, side))
+        if image_format == 'JPEG' and normalized.mode not in ('RGB', 'L'):
+            normalized = normalized.convert('RGB')
+        # запись PNG и других форматов берёт EXIF и профиль из info
+        normalized.info = {
+            key: value for key, value in normalized.info.items()
+            if key in KEPT_INFO
+        }
+
+    # результат не больше POST_IMAGE_MAX_SIDE и обычно умещается
+    # в памяти; крупный уходит во временный файл
+    content = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    normalized.save(content, image_format, quality=85, optimize=True)
+    size = content.tell()
+    content.seek(0)
+    return UploadedFile(
+        content, name, Image.MIME[image_format], size, upload.charset
+    )
@@ -30,6 +30,12 @@ urlpatterns = [
         views.PostDetail.as_view(),
         name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.PostCommentsList.as_view(),
+        name='comments'
+    ),
+    path('search/', views.PostSearch.as_view(), name='search'),
     path('follow/', views.FollowIndex.as_view(), name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -1,4 +1,7 @@
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 from .models import Post, Group, User, Comment, Follow
 from .forms import PostForm, CommentForm
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -6,26 +9,72 @@ from django.views import generic
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
+from core.pagination import CursorPaginationMixin, CursorPaginator
+from . import caching, counters, search, timelines
 
 POSTS_AMOUNT = 10
-
-
-class Index(generic.ListView):
+COMMENTS_AMOUNT = 20
+
+
+def comments_page(post, cursor=None):
+    """Страница комментариев к посту: первая или по курсору"""
+    paginator = CursorPaginator(
+        Comment.objects.for_display().filter(post=post), COMMENTS_AMOUNT,
+        count=post.comments_count,
+    )
+    if not cursor:
+        return paginator.first_page()
+    try:
+        return paginator.cursor_page(cursor)
+    except InvalidPage as e:
+        raise Http404(str(e))
+
+
+class Index(caching.ConditionalGetMixin, caching.PageCacheMixin,
+            caching.CardCacheMixin, caching.FeedCacheMixin,
+            CursorPaginationMixin, generic.ListView):
     """ListView главной страницы"""
-    model = Post
+    replica_reads = True
     template_name = 'posts/index.html'
     paginate_by = POSTS_AMOUNT
     context_object_name = 'posts'
 
+    def get_queryset(self):
+        return Post.objects.feed()
+
+    def get_paginate_count(self):
+        return counters.all_posts_count()
+
 
-class GroupPostsView(generic.ListView):
+class GroupPostsView(caching.ConditionalGetMixin, caching.PageCacheMixin,
+                     caching.CardCacheMixin, caching.FeedCacheMixin,
+                     CursorPaginationMixin, generic.ListView):
     """Рефакторинг страницы группы"""
+    replica_reads = True
     template_name = 'posts/group_list.html'
     paginate_by = POSTS_AMOUNT
 
-    def get_queryset(self):
+    def get_validator_scopes(self):
         self.group = get_object_or_404(Group, slug=self.kwargs['slug'])
-        return Post.objects.filter(group=self.group)
+        return [
+            *super().get_validator_scopes(),
+            caching.group_info_scope(self.group.pk),
+        ]
+
+    def get_queryset(self):
+        return Post.objects.feed().filter(group=self.group)
+
+    def get_paginate_count(self):
+        return counters.group_posts_count(self.group.pk)
+
+    def get_feed_scopes(self):
+        return [caching.group_scope(self.group.pk)]
+
+    def get_page_cache_tags(self):
+        return [
+            *super().get_page_cache_tags(),
+            caching.group_info_scope(self.group.pk),
+        ]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -33,19 +82,46 @@ class GroupPostsView(generic.ListView):
         return context
 
 
-class UserPostsView(generic.ListView):
+class UserPostsView(caching.ConditionalGetMixin, caching.PageCacheMixin,
+                    caching.CardCacheMixin, caching.FeedCacheMixin,
+                    CursorPaginationMixin, generic.ListView):
     """Рефакторинг страницы пользователя"""
+    replica_reads = True
     template_name = 'posts/profile.html'
     paginate_by = POSTS_AMOUNT
 
-    def get_queryset(self):
+    def get_validator_scopes(self):
         self.author = get_object_or_404(User, username=self.kwargs['username'])
-        return Post.objects.filter(author=self.author)
+        return [
+            *super().get_validator_scopes(),
+            caching.user_scope(self.author.pk),
+        ]
+
+    def get_etag_extra(self):
+        # кнопка подписки на автора
+        user = self.request.user
+        return [user.is_authenticated and Follow.objects.filter(
+            user=user, author=self.author
+        ).exists()]
+
+    def get_queryset(self):
+        return Post.objects.feed().filter(author=self.author)
+
+    def get_paginate_count(self):
+        return counters.author_posts_count(self.author.pk)
+
+    def get_feed_scopes(self):
+        return [caching.author_scope(self.author.pk)]
+
+    def get_page_cache_tags(self):
+        return [
+            *super().get_page_cache_tags(),
+            caching.user_scope(self.author.pk),
+        ]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        posts = self.author.posts.all()
-        context['posts_number'] = posts.count()
+        context['posts_number'] = context['paginator'].count
         context['author'] = self.author
         if self.request.user.is_authenticated:
             context['following'] = Follow.objects.filter(
@@ -54,25 +130,87 @@ class UserPostsView(generic.ListView):
         return context
 
 
-class PostDisplay(generic.DetailView):
+class PostDisplay(caching.ConditionalGetMixin, caching.PageCacheMixin,
+                  generic.DetailView):
     """Рефакторинг, отображает детали поста и форму для комментариев"""
     model = Post
     context_object_name = 'post'
     template_name = 'posts/post_detail.html'
 
+    def get_validator_scopes(self):
+        # пост нужен и для ответа 304, и для страницы целиком
+        self.post = get_object_or_404(
+            Post.objects.select_related('author', 'group'),
+            pk=self.kwargs['post_id']
+        )
+        # версия карточки сбрасывается и комментариями, USERS — имена
+        # авторов комментариев
+        return [
+            caching.USERS,
+            caching.author_scope(self.post.author_id),
+            *caching.post_tags([self.post]),
+        ]
+
     def get_object(self):
-        self.post = get_object_or_404(Post, pk=self.kwargs['post_id'])
         return self.post
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = self.post.text[:30]
-        context['comments'] = Comment.objects.filter(post=self.post)
-        context['posts_number'] = Post.objects.filter(
-            author=self.post.author).count()
+        context['comments'] = comments_page(self.post)
+        context['posts_number'] = counters.author_posts_count(
+            self.post.author_id)
         context['form'] = CommentForm()
+        if self.page_cache_versions is not None:
+            # имена авторов комментариев
+            self.page_cache_versions.update(caching.tag_versions({
+                caching.user_scope(comment.author_id)
+                for comment in context['comments']
+            }))
         return context
 
+    def get_page_cache_base_tags(self):
+        # карточку поста сбрасывают правка поста и комментарии
+        return [caching.card_scope(self.kwargs['post_id'])]
+
+    def get_page_cache_tags(self):
+        # число постов автора, его имя и название группы
+        return [
+            caching.author_scope(self.post.author_id),
+            *caching.post_tags([self.post]),
+        ]
+
+
+class PostCommentsList(generic.View):
+    """Следующие страницы комментариев: HTML-фрагмент или JSON"""
+    replica_reads = True
+
+    def get(self, request, *args, **kwargs):
+        post = get_object_or_404(
+            Post.objects.only('pk', 'comments_count'), pk=kwargs['post_id']
+        )
+        comments = comments_page(post, request.GET.get('cursor'))
+        html = render_to_string(
+            'posts/includes/comment_list.html',
+            {'post': post, 'comments': comments},
+            request,
+        )
+        if request.GET.get('format') != 'json':
+            return HttpResponse(html)
+        return JsonResponse({
+            'html': html,
+            'next_cursor': str(comments.next_cursor),
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+        })
+
 
 class PostComments(LoginRequiredMixin, generic.CreateView):
     """Рефакторинг, отвечает за добавление комментариев"""
@@ -96,6 +234,11 @@ class PostComments(LoginRequiredMixin, generic.CreateView):
 
 class PostDetail(generic.View):
     """Определяет запрос, перенаправляет на соответствующую функцию"""
+    # с реплик читается только GET (PostDisplay), комментарии пишутся
+    # и читаются на основной базе
+    replica_reads = True
+    page_cache = True
+
     def get(self, request, *args, **kwargs):
         view = PostDisplay.as_view()
         return view(request, *args, **kwargs)
@@ -148,21 +291,82 @@ class PostEdit(LoginRequiredMixin, generic.UpdateView):
             'post_id': self.obj.pk})
 
 
-class FollowIndex(LoginRequiredMixin, generic.ListView):
+class FollowIndex(LoginRequiredMixin, caching.ConditionalGetMixin,
+                  caching.CardCacheMixin, CursorPaginationMixin,
+                  generic.ListView):
     """Вывод постов авторов, на которых подписан пользователь"""
+    replica_reads = True
     template_name = 'posts/follow.html'
     paginate_by = POSTS_AMOUNT
     context_object_name = 'posts'
 
+    def get_validator_scopes(self):
+        user = self.request.user
+        self.followed = []
+        if timelines.fan_out_enabled():
+            # ленту сбрасывают раскладка постов, подписки и отписки;
+            # посты авторов, которые не раскладываются, — их области
+            self.merged = timelines.merged_authors(user)
+            return [
+                caching.GROUPS, caching.USERS,
+                caching.timeline_scope(user.pk),
+                *map(caching.author_scope, self.merged),
+            ]
+        self.followed = sorted(Follow.objects.filter(
+            user=user
+        ).values_list('author', flat=True))
+        return [
+            caching.GROUPS, caching.USERS,
+            *map(caching.author_scope, self.followed),
+        ]
+
+    def get_etag_extra(self):
+        # без раскладки подписки и отписки меняют ленту без сброса
+        # областей
+        return self.followed
+
     def get_queryset(self):
-        self.follower = get_object_or_404(User, username=self.request.user)
-        self.author = Follow.objects.filter(user=self.follower).values_list(
+        self.feed = None
+        if timelines.fan_out_enabled():
+            self.feed = timelines.follow_feed(
+                self.request.user, self.merged
+            )
+            return self.feed.posts
+        self.author = Follow.objects.filter(
+            user=self.request.user
+        ).values_list(
             'author',
             flat=True,
         )
-        self.posts = Post.objects.filter(author__in=self.author)
+        self.posts = Post.objects.feed().filter(author__in=self.author)
         return self.posts
 
+    def get_paginate_count(self):
+        if self.feed:
+            return self.feed.count
+        return counters.authors_posts_count(self.followed)
+
+    def get_paginate_key_fields(self):
+        if self.feed:
+            return self.feed.key_fields
+        return None
+
+
+class PostSearch(caching.CardCacheMixin, generic.ListView):
+    """Поиск постов по словам из текста, страницы по номерам"""
+    replica_reads = True
+    template_name = 'posts/search.html'
+    paginate_by = POSTS_AMOUNT
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.search(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
 
 @login_required
 def profile_follow(request, username):
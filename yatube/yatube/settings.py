@@ -57,6 +57,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.middleware.PageCacheMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -88,12 +90,84 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# профиль задаётся переменными окружения:
+# DB_PROFILE=production — постоянные соединения (DB_CONN_MAX_AGE
+#   секунд, по умолчанию 60) и настройки SQLite под нагрузку
+#   из SQLITE_PRAGMAS; по умолчанию соединение на каждый запрос;
+# DB_ENGINE=postgresql — PostgreSQL (нужен psycopg2) с параметрами
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT. Постоянное
+#   соединение держит каждый поток сервера приложений; общий пул
+#   на несколько процессов — PgBouncer, с ним задают DB_POOLER=pgbouncer
+DB_PROFILE = os.getenv('DB_PROFILE', 'development')
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+PRODUCTION_DB = DB_PROFILE == 'production'
+DB_CONN_MAX_AGE = int(os.getenv(
+    'DB_CONN_MAX_AGE', 60 if PRODUCTION_DB else 0
+))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'yatube'),
+            'USER': os.getenv('DB_USER', 'yatube'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # в режиме transaction PgBouncer отдаёт запросу любое
+            # соединение, курсоры на сервере с этим не работают
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('DB_POOLER') == 'pgbouncer'
+            ),
+            'OPTIONS': {'connect_timeout': 5},
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv(
+                'DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+    if PRODUCTION_DB:
+        # сколько секунд ждать, пока другой процесс держит запись
+        DATABASES['default']['OPTIONS'] = {'timeout': 20}
+
+# PRAGMA для каждого нового соединения с SQLite: в режиме WAL чтение
+# не ждёт записи, а synchronous=normal не синхронизирует диск
+# на каждой транзакции
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -20000,
+    'temp_store': 'memory',
+    'mmap_size': 128 * 1024 * 1024,
+} if PRODUCTION_DB else {}
+
+# копии базы только для чтения, через запятую в DATABASE_REPLICAS:
+# файлы SQLite или хосты PostgreSQL.
+# На них ходят представления с replica_reads = True, см.
+# core.middleware.ReplicaRoutingMiddleware. Тесты запускаются без
+# реплик: тестам пришлось бы перечислять их в databases
+READ_REPLICAS = []
+for number, name in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# сколько секунд после записи пользователь читает с основной базы
+REPLICA_STICKY_SECONDS = 10
 
 
 # Password validation
@@ -148,8 +222,94 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# CACHE_URL — адрес общего кэша с протоколом Redis, например
+# redis://127.0.0.1:6379/0 (для разработки: manage.py fake_redis).
+# Без него у каждого процесса свой LocMemCache, и сброс кэша в одном
+# процессе не виден остальным
+CACHE_URL = os.getenv('CACHE_URL')
+
+if CACHE_URL:
+    CACHES = {
+        # фрагменты лент дополнительно держим в памяти процесса:
+        # версия ленты входит в их ключ, поэтому они не устаревают
+        'default': {
+            'BACKEND': 'core.cache.backends.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'LOCAL_PREFIXES': ['template.cache.'],
+                'LOCAL_MAX_ENTRIES': 256,
+                'LOCAL_TIMEOUT': 60,
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache.backends.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# лента кэшируется надолго: фрагменты сбрасываются сигналами
+# при изменении постов и групп
+FEED_CACHE_TIMEOUT = 60 * 15
+# целые страницы для анонимных посетителей, см. PageCacheMiddleware;
+# сбрасываются теми же сигналами
+PAGE_CACHE_TIMEOUT = 60 * 15
+
+# лента подписок: 'read' — собирается при каждом запросе,
+# 'write' — посты раскладываются по лентам подписчиков при публикации,
+# 'hybrid' — как 'write', но см. FOLLOW_TIMELINE_FANOUT_LIMIT
+FOLLOW_TIMELINE = 'read'
+FOLLOW_TIMELINE_LENGTH = 1000
+FOLLOW_TIMELINE_BATCH = 500
+# в режиме 'hybrid' посты авторов, у которых подписчиков больше
+# этого порога, не раскладываются по лентам, а подмешиваются при чтении
+FOLLOW_TIMELINE_FANOUT_LIMIT = 10000
+
+# изображения постов выводятся через <picture> со srcset: для каждой
+# ширины и формата создаётся вариант с соотношением сторон
+# POST_IMAGE_ASPECT. Форматы перечислены по убыванию предпочтения,
+# последний — запасной для <img>; форматы, которые не умеет записывать
+# установленный Pillow, пропускаются. Варианты создаёт фоновый
+# обработчик (manage.py process_thumbnails), шаблоны только читают готовые
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_ASPECT = (960, 339)
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+# атрибут sizes для разных мест вывода изображения
+POST_IMAGE_SIZES = {
+    'feed': '(min-width: 1200px) 1110px, 100vw',
+    'aside': '(min-width: 768px) 25vw, 100vw',
 }
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_BATCH = 20
+THUMBNAIL_MAX_ATTEMPTS = 3
+# задание, которое выполняется дольше, считается брошенным
+# упавшим обработчиком и возвращается в очередь
+THUMBNAIL_STALE_AFTER = 60 * 10
+
+# загружаемые файлы пишутся на диск частями; файл больше
+# POST_IMAGE_MAX_UPLOAD_SIZE или изображение больше POST_IMAGE_MAX_PIXELS
+# не принимаются, остальные уменьшаются до POST_IMAGE_MAX_SIDE
+# по большей стороне и пересохраняются без EXIF и других метаданных.
+# Анимированные изображения не пересохраняются и метаданные сохраняют
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+
+# поиск по тексту постов: 'fts5' — таблица FTS5 в SQLite,
+# 'terms' — обратный индекс в таблице SearchTerm для любой базы,
+# None — FTS5, если он доступен. После смены индекса или загрузки
+# постов в обход сигналов нужен manage.py rebuild_search_index
+POST_SEARCH_BACKEND = None
+POST_SEARCH_MAX_RESULTS = 1000
+
+# в админке таблицы, в которых по оценке меньше строк, считаются
+# точно; в больших число строк без фильтров только оценивается
+ADMIN_EXACT_COUNT_LIMIT = 10000